@@ -21,6 +21,107 @@ class Settings(BaseSettings):
     linode_db_backup_bucket_access_key: str
     linode_db_backup_bucket_secret_key: str
 
+    # Metadata database connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: int = 1800  # Below MySQL's wait_timeout
+    db_pool_pre_ping: bool = True
+    db_connect_timeout: int = 10
+    db_echo: bool = False
+
+    # Thread pools used to run blocking upstream calls off the event loop
+    linode_api_workers: int = 16
+    object_storage_workers: int = 8
+    ssh_workers: int = 8
+
+    # Bulk deletes in object storage
+    object_storage_delete_concurrency: int = 4
+    object_storage_delete_retries: int = 3
+
+    # Backup catalog kept in the metadata database
+    backup_catalog_sync_interval: float = 300.0
+    backup_catalog_sync_concurrency: int = 4
+
+    # Retention of backups: a sweeper deleting expired backups found in the
+    # catalog, plus one bucket lifecycle rule per retention for tagged backups
+    backup_lifecycle_enabled: bool = True
+    retention_sweep_interval: float = 3600.0
+    backup_lifecycle_max_rules: int = 100
+    backup_lifecycle_lock_timeout: int = 30
+
+    # Backups started by the service instead of each instance's crontab
+    backup_scheduler_enabled: bool = False
+    backup_scheduler_interval: float = 30.0
+    backup_scheduler_concurrency: int = 4
+    backup_scheduler_region_concurrency: int = 2
+    backup_scheduler_catchup_hours: int = 24
+    backup_run_timeout: float = 10800.0
+    backup_tools_install_timeout: float = 300.0
+    backup_cron_reconcile_concurrency: int = 4
+
+    # Backup runs recorded from the logs the backup script uploads
+    backup_log_ingest_interval: float = 300.0
+    backup_log_ingest_concurrency: int = 4
+    backup_log_batch_size: int = 50
+
+    # Pooled SSH connections to database instances
+    ssh_pool_max_per_host: int = 2
+    ssh_pool_idle_timeout: float = 300.0
+    ssh_keepalive_interval: int = 30
+    ssh_connect_timeout: float = 15.0
+    ssh_checkout_timeout: float = 120.0
+
+    # Shared cache of Linode Instance and Firewall objects, TTLs in seconds
+    linode_cache_max_entries: int = 2048
+    linode_cache_status_ttl: float = 5.0
+    linode_cache_specs_ttl: float = 300.0
+    linode_cache_firewall_ttl: float = 60.0
+
+    # Full rebuilds of the local firewall index, dropping databases deleted by
+    # other processes
+    firewall_index_full_refresh_interval: float = 300.0
+
+    # Per-part timeouts, in seconds, for composite endpoints
+    fanout_part_timeout: float = 5.0
+    fanout_stats_timeout: float = 3.0
+
+    # Background provisioning of new databases
+    provisioning_workers: int = 4
+    provisioning_step_retries: int = 2
+    provisioning_retry_backoff: float = 2.0
+    # Seconds a job stays claimed without progress before another worker or
+    # replica may resume it, and how often workers look for such jobs
+    provisioning_job_lease: float = 900.0
+    provisioning_resume_interval: float = 60.0
+    bulk_provisioning_concurrency: int = 5
+
+    # Local store of instance stats, 2016 points is 7 days at 5 minutes
+    stats_buffer_capacity: int = 2016
+    stats_ingest_interval: float = 300.0
+    stats_max_points: int = 288
+
+    # Connectivity probes of the managed databases, timeouts in seconds
+    db_probe_connect_timeout: float = 3.0
+    db_probe_query_timeout: float = 2.0
+    db_probe_concurrency: int = 20
+    db_probe_cache_ttl: float = 15.0
+    db_probe_cache_max_entries: int = 4096
+
+    # Server-Sent Events of status and stats changes, intervals in seconds
+    events_poll_interval: float = 5.0
+    events_keepalive_interval: float = 15.0
+    events_queue_size: int = 100
+
+    # Client-side pacing and retries of Linode API requests
+    linode_api_requests_per_minute: int = 800
+    linode_api_burst: int = 20
+    linode_api_max_retries: int = 4
+    linode_api_backoff_base: float = 0.5
+    linode_api_backoff_max: float = 30.0
+    # Seconds per attempt, requests without one could hold a worker forever
+    linode_api_request_timeout: float = 30.0
+
     class Config:
         env_file = ".env"
 
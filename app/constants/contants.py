@@ -1,5 +1,5 @@
 from app.config import settings
-from app.constants.enums import DatabaseType
+from app.constants.enums import DatabaseType, BackupCodec
 import pkg_resources
 from string import Template
 
@@ -30,10 +30,46 @@ BACKUP_SCRIPT_SUFFIXES = {
     ),
 }
 
+# Environment of the backup script in the cron line
+BACKUP_SCRIPT_ENV = Template(
+    "BACKUP_CODEC=$CODEC COMPRESSION_LEVEL=$LEVEL COMPRESSION_THREADS=$THREADS RETENTION_DAYS=$RETENTION_DAYS"
+)
+
+# pigz writes gzip streams, so both decode as gzip
+BACKUP_CODEC_EXTENSIONS = {
+    BackupCodec.gzip.value: "gz",
+    BackupCodec.pigz.value: "gz",
+    BackupCodec.zstd.value: "zst",
+}
+
+BACKUP_EXTENSION_CODECS = {"gz": BackupCodec.gzip.value, "zst": BackupCodec.zstd.value}
+
+BACKUP_CODEC_LEVELS = {
+    BackupCodec.gzip.value: (1, 9),
+    BackupCodec.pigz.value: (1, 9),
+    BackupCodec.zstd.value: (1, 19),
+}
+
+CODEC_BENCHMARK_SCRIPT = pkg_resources.resource_string(
+    "app", "data/codec_benchmark.sh"
+).decode("utf-8")
+
+CODEC_BENCHMARK_SCRIPT_SAVE_PATH = "/usr/local/bin/codec_benchmark.sh"
+
 MAX_BACKUP_LIMIT = "7"
 
+DEFAULT_BACKUP_RETENTION_DAYS = int(MAX_BACKUP_LIMIT)
+
+# Object tag read by the bucket's lifecycle rules, one rule per retention
+BACKUP_RETENTION_TAG = "retention-days"
+
 BACKUP_SCRIPT_SAVE_PATH = "/usr/local/bin/backup_script.sh"
 
+# Markers of the crontab block holding a database's backup entries
+BACKUP_CRON_BLOCK_BEGIN = "# BEGIN linode-db backups"
+BACKUP_CRON_BLOCK_END = "# END linode-db backups"
+BACKUP_CRON_SCHEDULE_TAG = "# schedule "
+
 S3CFG_FILE_PATH = "~/.s3cfg"
 
 S3CFG_CONTENT = Template(
@@ -96,6 +132,10 @@ FIREWALL_SPECIFIC_CONFIGS = {
 
 BACKUP_FOLDER_CONFIG = Template("$DATABASE_TYPE/$USER_ID/$DB_ID")
 
+BACKUP_LOG_FOLDER_CONFIG = Template("logs/$DATABASE_TYPE/$USER_ID/$DB_ID")
+
+OBJECT_STORAGE_DELETE_BATCH_SIZE = 1000  # Max keys per delete_objects call
+
 FIREWALL_ALLOWED_PROTOCOLS = ["TCP", "UDP", "ICMP"]
 
 FIREWALL_ACTIONS = ["ACCEPT", "DROP"]
@@ -23,7 +23,28 @@ class BackupSchedule(str, Enum):
     weekly = "weekly"
     monthly = "monthly"
 
+class BackupCodec(str, Enum):
+    gzip = "gzip"
+    pigz = "pigz"
+    zstd = "zstd"
+
 class BackupStatus(Enum):
     SCHEDULED = "scheduled"
+    RUNNING = "running"
     COMPLETED = "completed"
-    FAILED = "failed"
\ No newline at end of file
+    FAILED = "failed"
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class ProvisioningStep(str, Enum):
+    # Ordered, each value is the last step that completed successfully
+    pending = "pending"
+    instance_created = "instance_created"
+    firewall_created = "firewall_created"
+    firewall_attached = "firewall_attached"
+    database_stored = "database_stored"
@@ -1 +1,3 @@
 DATABASE_NOT_FOUND_ERROR = "Database not found"
+JOB_NOT_FOUND_ERROR = "Job not found"
+BACKUP_SCHEDULE_NOT_FOUND_ERROR = "Backup schedule not found"
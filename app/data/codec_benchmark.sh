@@ -0,0 +1,61 @@
+#!/bin/bash
+
+# Compress a sample of the database dump with every available codec and
+# print one JSON line per codec and level with its throughput and ratio.
+
+if [ "$#" -ne 5 ]; then
+    echo "Usage: $0 <DB_HOST> <DB_USER> <DB_PASSWORD> <DB_NAME> <SAMPLE_MB>"
+    exit 1
+fi
+
+DB_HOST="$1"
+DB_USER="$2"
+DB_PASSWORD="$3"
+DB_NAME="$4"
+SAMPLE_MB="$5"
+
+if [ "$DB_NAME" == "all" ]; then
+    DB_NAME="--all-databases"
+fi
+
+CPUS=$(nproc)
+SAMPLE_FILE=$(mktemp /tmp/codec_benchmark_XXXXXX.sql)
+trap 'rm -f "$SAMPLE_FILE"' EXIT
+
+mysqldump --single-transaction --quick -h "$DB_HOST" -u "$DB_USER" -p"$DB_PASSWORD" "$DB_NAME" 2> /dev/null \
+    | head -c "$((SAMPLE_MB * 1024 * 1024))" > "$SAMPLE_FILE"
+INPUT_BYTES=$(stat -c %s "$SAMPLE_FILE")
+if [ "$INPUT_BYTES" -eq 0 ]; then
+    echo "Failed to dump a sample of the database." >&2
+    exit 1
+fi
+
+compress() {
+    case "$1" in
+        gzip) gzip -c "-$2" ;;
+        pigz) pigz -c -p "$CPUS" "-$2" ;;
+        zstd) zstd -c -q -T"$CPUS" "-$2" ;;
+    esac
+}
+
+for SPEC in gzip:1 gzip:6 pigz:1 pigz:6 zstd:1 zstd:3 zstd:9; do
+    CODEC="${SPEC%%:*}"
+    LEVEL="${SPEC##*:}"
+    if ! command -v "$CODEC" > /dev/null; then
+        continue
+    fi
+
+    STARTED=$(date +%s.%N)
+    OUTPUT_BYTES=$(compress "$CODEC" "$LEVEL" < "$SAMPLE_FILE" | wc -c)
+    FINISHED=$(date +%s.%N)
+
+    awk -v codec="$CODEC" -v level="$LEVEL" -v cpus="$CPUS" \
+        -v input="$INPUT_BYTES" -v output="$OUTPUT_BYTES" \
+        -v started="$STARTED" -v finished="$FINISHED" 'BEGIN {
+        seconds = finished - started
+        if (seconds <= 0) seconds = 0.000001
+        threads = (codec == "gzip") ? 1 : cpus
+        printf "{\"codec\": \"%s\", \"level\": %d, \"threads\": %d, \"input_bytes\": %d, \"output_bytes\": %d, \"seconds\": %.3f, \"throughput_mb_s\": %.2f, \"ratio\": %.3f}\n",
+            codec, level, threads, input, output, seconds, input / seconds / 1048576, input / (output > 0 ? output : 1)
+    }'
+done
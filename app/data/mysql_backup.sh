@@ -6,6 +6,28 @@ if [ "$#" -lt 11 ] || [ "$#" -gt 11 ]; then
     exit 1
 fi
 
+# Optional settings, passed as environment variables
+#   BACKUP_MODE: "stream" pipes dump, compression and upload without local
+#                files (default, needs s3cmd, installed on deploy), "file"
+#                dumps to /tmp first. The mode that ran is in BACKUP_SUMMARY.
+#   MULTIPART_CHUNK_SIZE_MB: part size of the streamed multipart upload
+#   BACKUP_CODEC: "gzip" (default), "pigz" or "zstd"
+#   COMPRESSION_LEVEL: codec level, the codec's default when empty
+#   COMPRESSION_THREADS: pigz and zstd threads, 0 uses every core
+#   RETENTION_DAYS: tags the streamed backup so the bucket's lifecycle rule
+#                   for that retention expires it, untagged when empty
+#   BACKUP_RUN_ID: id of the run that started the script, logged in the
+#                  summary, empty for cron runs
+BACKUP_MODE="${BACKUP_MODE:-stream}"
+MULTIPART_CHUNK_SIZE_MB="${MULTIPART_CHUNK_SIZE_MB:-64}"
+BACKUP_CODEC="${BACKUP_CODEC:-gzip}"
+COMPRESSION_LEVEL="${COMPRESSION_LEVEL:-}"
+COMPRESSION_THREADS="${COMPRESSION_THREADS:-0}"
+RETENTION_DAYS="${RETENTION_DAYS:-}"
+BACKUP_RUN_ID="${BACKUP_RUN_ID:-}"
+
+set -o pipefail
+
 perform_backup() {
     # Assigning passed arguments to variables
     DB_HOST="$1"
@@ -14,7 +36,7 @@ perform_backup() {
     DB_NAME="$4"
     BUCKET_NAME="$5"
     OBJECT_STORAGE_REGION="$6"
-    MAX_BACKUPS="$7"
+    MAX_BACKUPS="$7" # Unused, retention is managed by the API with lifecycle rules
     BACKUP_FILE_PREFIX="$8"
     USER_ID="$9"
     DB_TYPE="${10}"
@@ -25,13 +47,14 @@ perform_backup() {
     fi
 
     LOG_DIR="/logs"
+    ENDPOINT_HOST="${OBJECT_STORAGE_REGION}.linodeobjects.com"
+    S3CMD_HOST_ARGS=(--host="$ENDPOINT_HOST" --host-bucket="%(bucket)s.$ENDPOINT_HOST")
 
     # Backup filename
     DATE=$(date +%Y-%m-%d_%H-%M-%S)
     YEAR=$(date +%Y)
     MONTH=$(date +%m)
     BACKUP_FILE="/tmp/${BACKUP_FILE_PREFIX}_${DATE}.sql"
-    COMPRESSED_BACKUP_FILE="${BACKUP_FILE_PREFIX}_${DATE}.gz"
     LOCAL_LOG_FILE="/tmp/${DATE}_backup.log"
     LOG_FILE_PATH="logs/${DB_TYPE}/${USER_ID}/${DB_ID}/${YEAR}/${MONTH}/${DATE}_backup.log"
 
@@ -41,70 +64,159 @@ perform_backup() {
         echo $1
     }
 
-    # Create a MySQL database backup from a remote host
-    mysqldump -h "$DB_HOST" -u "$DB_USER" -p"$DB_PASSWORD" "$DB_NAME" > "$BACKUP_FILE"
-
-    if [ $? -eq 0 ]; then
-        log_message "Database backup was successful."
-    else
-        log_message "Database backup failed."
+    # Never run another codec than the scheduled one, deploy installs it
+    CODEC_MISSING=0
+    if [ "$BACKUP_CODEC" != "gzip" ] && ! command -v "$BACKUP_CODEC" > /dev/null; then
+        log_message "$BACKUP_CODEC is not installed, the backup failed."
+        CODEC_MISSING=1
+    fi
+    if [ "$COMPRESSION_THREADS" -eq 0 ]; then
+        COMPRESSION_THREADS=$(nproc)
     fi
 
-    # Compress the backup file
-    log_message "Compressing the backup file..."
-    gzip -c "$BACKUP_FILE" > "/tmp/${COMPRESSED_BACKUP_FILE}"
-    log_message "Backup file compressed."
-
+    # The extension tells listing and restore how to decode the object
+    case "$BACKUP_CODEC" in
+        pigz)
+            EXTENSION="gz"
+            compress() { pigz -c -p "$COMPRESSION_THREADS" ${COMPRESSION_LEVEL:+-$COMPRESSION_LEVEL}; }
+            ;;
+        zstd)
+            EXTENSION="zst"
+            compress() { zstd -c -q -T"$COMPRESSION_THREADS" ${COMPRESSION_LEVEL:+-$COMPRESSION_LEVEL}; }
+            ;;
+        *)
+            BACKUP_CODEC="gzip"
+            EXTENSION="gz"
+            compress() { gzip -c ${COMPRESSION_LEVEL:+-$COMPRESSION_LEVEL}; }
+            ;;
+    esac
+
+    COMPRESSED_BACKUP_FILE="${BACKUP_FILE_PREFIX}_${DATE}.${EXTENSION}"
     TARGET_PATH="s3://${BUCKET_NAME}/${DB_TYPE}/${USER_ID}/${DB_ID}/${YEAR}/${MONTH}/${COMPRESSED_BACKUP_FILE}"
-    s4cmd put "/tmp/${COMPRESSED_BACKUP_FILE}" "$TARGET_PATH" --endpoint-url=https://"$OBJECT_STORAGE_REGION".linodeobjects.com
 
-    if [ $? -eq 0 ]; then
-        log_message "Compressed backup successfully uploaded to Linode Object Storage."
-    else
-        log_message "Failed to upload compressed backup to Linode Object Storage."
-    fi
+    # Never leave dumps behind in /tmp, whatever happens
+    cleanup() {
+        rm -f "$BACKUP_FILE" "/tmp/${COMPRESSED_BACKUP_FILE}"
+    }
+    trap cleanup EXIT
 
-    # Optional: Remove the local compressed backup file to save space
-    rm "/tmp/${COMPRESSED_BACKUP_FILE}"
+    # InnoDB tables are dumped from a consistent snapshot without locking
+    # them, rows are streamed instead of buffered in memory
+    dump_database() {
+        mysqldump --single-transaction --quick -h "$DB_HOST" -u "$DB_USER" -p"$DB_PASSWORD" "$DB_NAME"
+    }
 
-    # Managing the retention of backups
+    stream_backup() {
+        log_message "Streaming the backup to $TARGET_PATH..."
+        UPLOAD_STARTED=$(date +%s)
+        dump_database \
+            | compress \
+            | s3cmd put - "$TARGET_PATH" "${S3CMD_HOST_ARGS[@]}" --multipart-chunk-size-mb="$MULTIPART_CHUNK_SIZE_MB" \
+                --add-header="x-amz-meta-codec:${BACKUP_CODEC}" \
+                ${RETENTION_DAYS:+--add-header="x-amz-tagging:retention-days=${RETENTION_DAYS}"} > /dev/null
+        STAGE_STATUS=("${PIPESTATUS[@]}")
+        UPLOAD_SECONDS=$(( $(date +%s) - UPLOAD_STARTED ))
+
+        if [ "${STAGE_STATUS[0]}" -ne 0 ]; then
+            log_message "Database backup failed (mysqldump exited with ${STAGE_STATUS[0]})."
+        fi
+        if [ "${STAGE_STATUS[1]}" -ne 0 ]; then
+            log_message "Compressing the backup failed ($BACKUP_CODEC exited with ${STAGE_STATUS[1]})."
+        fi
+        if [ "${STAGE_STATUS[2]}" -ne 0 ]; then
+            log_message "Failed to upload compressed backup to Linode Object Storage (s3cmd exited with ${STAGE_STATUS[2]})."
+        fi
 
-    # If we have more than MAX_BACKUPS, delete the oldest
-    # Calculate the cutoff date. Files older than this date will be deleted.
-    CUTOFF_DATE=$(date -d "-$MAX_BACKUPS days" +%Y-%m-%d)
+        if [ "${STAGE_STATUS[0]}" -ne 0 ] || [ "${STAGE_STATUS[1]}" -ne 0 ] || [ "${STAGE_STATUS[2]}" -ne 0 ]; then
+            # An upload that completed from a broken dump must not pass for a backup
+            s3cmd del "$TARGET_PATH" "${S3CMD_HOST_ARGS[@]}" > /dev/null 2>&1
+            return 1
+        fi
 
-    # List all backup files in the specific database backup directory
-    BACKUP_DIR="$DB_TYPE/$USER_ID/$DB_ID"
-    log_message "Checking for old backups in the $BACKUP_DIR directory..."
-    BACKUP_FILES=$(s4cmd ls s3://$BUCKET_NAME/$BACKUP_DIR/ --endpoint-url=https://$OBJECT_STORAGE_REGION.linodeobjects.com)
+        BACKUP_BYTES=$(s3cmd ls "$TARGET_PATH" "${S3CMD_HOST_ARGS[@]}" | awk '{print $3}')
+        log_message "Database backup was successful."
+        log_message "Compressed backup successfully uploaded to Linode Object Storage."
+        return 0
+    }
+
+    file_backup() {
+        # Create a MySQL database backup from a remote host
+        dump_database > "$BACKUP_FILE"
 
-    log_message "Checking for backups older than $MAX_BACKUPS days..."
+        if [ $? -eq 0 ]; then
+            log_message "Database backup was successful."
+        else
+            log_message "Database backup failed."
+            return 1
+        fi
 
-    # Iterate through the list of backup files
-    echo "$BACKUP_FILES" | while read -r line; do
-        # Extract the full path of the backup file
-        BACKUP_PATH=$(echo "$line" | awk '{print $4}')
-        # if backup path is empty, skip the iteration
-        if [ -z "$BACKUP_PATH" ]; then
-            continue
+        # Compress the backup file
+        log_message "Compressing the backup file with $BACKUP_CODEC..."
+        compress < "$BACKUP_FILE" > "/tmp/${COMPRESSED_BACKUP_FILE}"
+        if [ $? -ne 0 ]; then
+            log_message "Compressing the backup failed."
+            return 1
+        fi
+        rm -f "$BACKUP_FILE"
+        log_message "Backup file compressed."
+
+        BACKUP_BYTES=$(stat -c %s "/tmp/${COMPRESSED_BACKUP_FILE}")
+        UPLOAD_STARTED=$(date +%s)
+        # s3cmd tags the backup for the lifecycle rules, s4cmd can't
+        if command -v s3cmd > /dev/null; then
+            s3cmd put "/tmp/${COMPRESSED_BACKUP_FILE}" "$TARGET_PATH" "${S3CMD_HOST_ARGS[@]}" \
+                --add-header="x-amz-meta-codec:${BACKUP_CODEC}" \
+                ${RETENTION_DAYS:+--add-header="x-amz-tagging:retention-days=${RETENTION_DAYS}"} > /dev/null
+        else
+            log_message "s3cmd is not installed, the backup is uploaded untagged."
+            s4cmd put "/tmp/${COMPRESSED_BACKUP_FILE}" "$TARGET_PATH" --endpoint-url=https://"$ENDPOINT_HOST"
         fi
+        UPLOAD_STATUS=$?
+        UPLOAD_SECONDS=$(( $(date +%s) - UPLOAD_STARTED ))
 
-        # Extract the timestamp from the backup file name
-        BACKUP_TIMESTAMP=$(basename "$BACKUP_PATH" .gz | awk -F '_' '{print $2}')
+        # Remove the local compressed backup file to save space
+        rm -f "/tmp/${COMPRESSED_BACKUP_FILE}"
 
-        # Compare the backup timestamp to the cutoff date
-        if [[ "$BACKUP_TIMESTAMP" < "$CUTOFF_DATE" ]]; then
-            # Delete backups older than the cutoff date
-            log_message "Deleting old backup: $BACKUP_PATH"
-            s4cmd del "$BACKUP_PATH" --endpoint-url=https://$OBJECT_STORAGE_REGION.linodeobjects.com
+        if [ $UPLOAD_STATUS -eq 0 ]; then
+            log_message "Compressed backup successfully uploaded to Linode Object Storage."
+        else
+            log_message "Failed to upload compressed backup to Linode Object Storage."
+            return 1
         fi
-    done
+        return 0
+    }
+
+    if [ "$BACKUP_MODE" == "stream" ] && ! command -v s3cmd > /dev/null; then
+        log_message "s3cmd is not installed, falling back to file mode."
+        BACKUP_MODE="file"
+    fi
+
+    BACKUP_STARTED=$(date +%s)
+    BACKUP_BYTES=0
+    UPLOAD_SECONDS=0
+    if [ "$CODEC_MISSING" -eq 1 ]; then
+        false
+    elif [ "$BACKUP_MODE" == "stream" ]; then
+        stream_backup
+    else
+        file_backup
+    fi
+    BACKUP_STATUS=$?
+    # A failed run's object has been removed, so it has no key
+    SUMMARY_KEY=""
+    if [ $BACKUP_STATUS -eq 0 ]; then
+        SUMMARY_STATUS="completed"
+        SUMMARY_KEY="${TARGET_PATH#s3://${BUCKET_NAME}/}"
+    else
+        SUMMARY_STATUS="failed"
+    fi
 
-    log_message "Old backup cleanup complete."
+    # Machine-readable outcome of the run, one line per backup
+    log_message "BACKUP_SUMMARY status=${SUMMARY_STATUS} mode=${BACKUP_MODE} codec=${BACKUP_CODEC} level=${COMPRESSION_LEVEL:-default} duration=$(( $(date +%s) - BACKUP_STARTED )) bytes=${BACKUP_BYTES:-0} upload_seconds=${UPLOAD_SECONDS} key=${SUMMARY_KEY} run_id=${BACKUP_RUN_ID}"
 
     log_message "Uploading log file to Linode Object Storage."
 
-    s4cmd put "$LOCAL_LOG_FILE" "s3://${BUCKET_NAME}/${LOG_FILE_PATH}" --endpoint-url=https://"$OBJECT_STORAGE_REGION".linodeobjects.com
+    s4cmd put "$LOCAL_LOG_FILE" "s3://${BUCKET_NAME}/${LOG_FILE_PATH}" --endpoint-url=https://"$ENDPOINT_HOST"
 
     if [ $? -eq 0 ]; then
         echo "Log file successfully uploaded to Linode Object Storage."
@@ -114,9 +226,13 @@ perform_backup() {
 
     # Cleanup local log file
     rm "$LOCAL_LOG_FILE"
+
+    return $BACKUP_STATUS
 }
 
 perform_backup "$1" "$2" "$3" "$4" "$5" "$6" "$7" "$8" "$9" "${10}" "${11}"
-if [ $? -ne 0 ]; then
+BACKUP_STATUS=$?
+if [ $BACKUP_STATUS -ne 0 ]; then
     echo "An error occurred while backup."
-fi
\ No newline at end of file
+fi
+exit $BACKUP_STATUS
@@ -1,52 +1,158 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import time
+from fastapi import FastAPI, Depends, HTTPException, Request, Query, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import uuid4
-from app.models import Database, BackupSchedule
+from app.models import Database, BackupSchedule, ProvisioningJob
 from app.models.requests import (
     DatabaseRequest,
+    BulkDatabaseRequest,
     DatabaseBackupRequest,
     DatabaseUpdateRequest,
     DatabaseBackupDeleteRequest,
+    DatabaseBackupBulkDeleteRequest,
     FirewallRequest,
     FirewallUpdateRequest,
 )
 
 # from app.auth.auth import auth_backend, fastapi_users, current_active_user
-from app.utils.linode import (
-    create_linode_instance,
+from app.utils.async_linode import (
     deploy_backup_script,
+    run_codec_benchmark,
     update_linode_instance,
     delete_linode_instance,
     get_unique_instance_name,
     get_instance_name_from_label,
-    get_linode_stats,
     get_instance_status,
-    get_backups,
+    list_instance_statuses,
+    list_backups_page,
+    iter_backup_pages,
     get_linode_instance_details,
     delete_backup,
-    create_firewall,
+    delete_backups,
+    delete_database_backups,
     list_firewalls,
     get_firewall,
     update_firewall,
     delete_firewall,
-    add_instance_to_firewall,
     validate_firewall_rules,
 )
 from app.utils.db import (
     get_db,
+    async_session_maker,
+    init_engine,
+    dispose_engine,
+    get_pool_stats,
     convert_schedule_to_cron,
     validate_backup_schedule_inputs,
-    check_connection_to_database,
+    probe_database,
+    probe_databases,
+    probe_cache,
 )
 from app.models.requests import UserCreate, UserUpdate, UserDB
-from app.constants.enums import BackupStatus
-from datetime import datetime
+from app.constants.enums import BackupStatus, JobStatus
+from datetime import datetime, date
+from sqlalchemy import delete
 from sqlalchemy.future import select
 from sqlalchemy.exc import NoResultFound
-from app.constants.errors import DATABASE_NOT_FOUND_ERROR
+from app.constants.errors import (
+    DATABASE_NOT_FOUND_ERROR,
+    JOB_NOT_FOUND_ERROR,
+    BACKUP_SCHEDULE_NOT_FOUND_ERROR,
+)
+from app.constants.contants import BACKUP_CODEC_LEVELS
+from app.utils.executors import (
+    get_executor_stats,
+    shutdown_executors,
+    gather_parts,
+    run_blocking,
+    iterate_blocking,
+    SSH_POOL,
+    OBJECT_STORAGE_POOL,
+)
+from app.config import settings
+from app.utils.cache import request_cache_scope
+from app.utils.metrics import registry, http_request_duration, http_requests
+from app.resources.resources import linode_cache, ssh_pool, backup_ssh_pool
+from app.utils.firewall_index import firewall_index, run_firewall_index_refresh
+from app.utils.events import status_watcher, Subscription
+from app.utils.schedule_planner import plan_backup_offset
+from app.utils.backup_scheduler import backup_scheduler
+from app.utils.backup_cron import reconcile_backup_cron, reconcile_all_backup_cron
+from app.utils.backup_runs import (
+    ingest_backup_logs,
+    list_backup_runs,
+    get_backup_run_trends,
+    run_backup_log_ingestion,
+)
+from app.utils.retention import (
+    apply_backup_retention,
+    sweep_expired_backups,
+    run_retention_sweep,
+)
+from app.utils.stats_store import (
+    stats_store,
+    refresh_instance_stats,
+    get_instance_stats_summary,
+    STATS_AGGREGATIONS,
+    STATS_MIN_RESOLUTION,
+)
+from app.utils.pagination import encode_keyset_cursor, keyset_after
+from app.utils.backup_catalog import (
+    sync_backup_catalog,
+    remove_from_catalog,
+    list_catalog_backups,
+    summarize_catalog_backups,
+    run_backup_catalog_sync,
+)
+from app.utils.jobs import (
+    new_provisioning_job,
+    describe_job,
+    provisioning_workers,
+    provision_databases_bulk,
+)
+
+
+async def evict_idle_ssh_connections():
+    while True:
+        await asyncio.sleep(settings.ssh_pool_idle_timeout / 2)
+        await run_blocking(SSH_POOL, ssh_pool.evict_idle)
+        await run_blocking(SSH_POOL, backup_ssh_pool.evict_idle)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_engine()
+    async with async_session_maker() as session:
+        await firewall_index.refresh(session)
+    await provisioning_workers.start()
+    background_tasks = [
+        asyncio.create_task(evict_idle_ssh_connections()),
+        asyncio.create_task(run_backup_catalog_sync()),
+        asyncio.create_task(status_watcher.run()),
+        asyncio.create_task(run_retention_sweep()),
+        asyncio.create_task(run_backup_log_ingestion()),
+        asyncio.create_task(run_firewall_index_refresh()),
+    ]
+    if settings.backup_scheduler_enabled:
+        background_tasks.append(asyncio.create_task(backup_scheduler.run()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await backup_scheduler.stop()
+    await provisioning_workers.stop()
+    shutdown_executors(wait=False)
+    ssh_pool.close_all()
+    backup_ssh_pool.close_all()
+    await dispose_engine()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -54,8 +160,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+
+@app.middleware("http")
+async def linode_request_cache(request: Request, call_next):
+    # Each Linode object is loaded at most once while serving a request
+    with request_cache_scope():
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template keeps the label cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        http_request_duration.observe(
+            time.perf_counter() - started, method=request.method, route=route_path
+        )
+        http_requests.inc(method=request.method, route=route_path, status=status)
+
+
 # # Include the FastAPI Users routes
 # app.include_router(
 #     fastapi_users.get_auth_router(auth_backend),
@@ -74,88 +207,135 @@ app.add_middleware(
 # )
 
 
-@app.post("/create_database/")
+@app.post("/create_database/", status_code=202)
 async def create_database(
     db_request: DatabaseRequest, session: AsyncSession = Depends(get_db)
 ):
 
     try:
+        # Provisioning runs in the background, the job reports its progress
+        job = new_provisioning_job(db_request)
+        session.add(job)
+        await session.commit()
 
-        db_id = str(uuid4())
-        instance_label = get_unique_instance_name(db_id, db_request.db_name)
-
-        new_instance_pass = str(uuid4())
-        new_db_pass = str(uuid4())
-
-        instance = create_linode_instance(
-            label=instance_label,
-            db_type=db_request.db_type,
-            instance_root_password=new_instance_pass,
-            db_root_password=new_db_pass,
-            new_user=db_request.new_user,
-            new_user_password=db_request.new_user_password,
-            instance_type=db_request.instance_type,
-            region=db_request.region,
-        )
-
-        firewall = create_firewall(
-            instance_id=instance.id,
-            db_type=db_request.db_type,
-        )
-
-        firewall_status = add_instance_to_firewall(
-            firewall_id=firewall.get("id"),
-            instance_id=instance.id,
-        )
-
-        # Store the database information in the Database table
-        db_instance = Database(
-            id=db_id,
-            user_id=db_request.user_id,
-            db_type=db_request.db_type,
-            db_name=instance_label,
-            db_instance_id=str(instance.id),
-            instance_type=db_request.instance_type,
-            region=db_request.region,
-            db_root_password=new_db_pass,
-            instance_root_password=new_instance_pass,
-            firewall_id=firewall.get("id"),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
+        provisioning_workers.submit(job.id)
+
+        return {
+            "message": "Database provisioning started",
+            "job_id": job.id,
+            "database_id": job.database_id,
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error creating database instance: {str(e)}"
         )
 
-        session.add(db_instance)
-        await session.commit()
 
+@app.post("/create_databases/")
+async def create_databases(
+    bulk_request: BulkDatabaseRequest, session: AsyncSession = Depends(get_db)
+):
+    try:
+        results = await provision_databases_bulk(bulk_request.items, session)
         return {
-            "message": "Database instance created successfully",
-            "database_id": db_instance.id,
-            "instance_id": db_instance.db_instance_id,
-            "instance_type": db_instance.instance_type,
-            "region": db_instance.region,
-            "firewall_status": firewall_status,
+            "created": sum(1 for r in results if r["status"] == "created"),
+            "failed": sum(1 for r in results if r["status"] == "failed"),
+            "running": sum(1 for r in results if r["status"] == "running"),
+            "results": results,
         }
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Error creating database instance: {str(e)}"
+            status_code=500, detail=f"Error creating database instances: {str(e)}"
         )
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, session: AsyncSession = Depends(get_db)):
+    job = await session.get(ProvisioningJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=400, detail=JOB_NOT_FOUND_ERROR)
+    return describe_job(job)
+
+
+@app.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_job(job_id: str, session: AsyncSession = Depends(get_db)):
+    job = await session.get(ProvisioningJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=400, detail=JOB_NOT_FOUND_ERROR)
+    if job.status != JobStatus.failed:
+        raise HTTPException(status_code=400, detail="Only failed jobs can be retried")
+
+    job.status = JobStatus.queued
+    await session.commit()
+    provisioning_workers.submit(job.id)
+    return describe_job(job)
+
+
+DATABASE_LIST_COLUMNS = (
+    Database.id,
+    Database.db_name,
+    Database.instance_type,
+    Database.region,
+    Database.created_at,
+    Database.updated_at,
+)
+
+
+def describe_database_row(row) -> dict:
+    return {
+        "database_id": row.id,
+        "database_name": get_instance_name_from_label(row.db_name),
+        "instance_type": row.instance_type,
+        "region": row.region,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }
+
+
 @app.get("/databases/")
-async def list_databases(session: AsyncSession = Depends(get_db)):
-    result = await session.execute(select(Database))
-    databases = result.scalars().all()
-    return [
-        {
-            "database_id": database.id,
-            "database_name": get_instance_name_from_label(database.db_name),
-            "instance_type": database.instance_type,
-            "region": database.region,
-            "created_at": database.created_at,
-            "updated_at": database.updated_at,
-        }
-        for database in databases
-    ]
+async def list_databases(
+    response: Response,
+    user_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    session: AsyncSession = Depends(get_db),
+):
+    # Only the returned columns, in (created_at, id) order for keyset paging
+    query = select(*DATABASE_LIST_COLUMNS).order_by(Database.created_at, Database.id)
+    if user_id:
+        query = query.where(Database.user_id == user_id)
+    if cursor:
+        try:
+            query = query.where(keyset_after(Database.created_at, Database.id, cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        # The request session is closed before the body is sent, use our own
+        async def database_array():
+            yield "["
+            first = True
+            async with async_session_maker() as stream_session:
+                rows = await stream_session.stream(
+                    query.execution_options(yield_per=500)
+                )
+                async for row in rows:
+                    item = json.dumps(describe_database_row(row), default=str)
+                    yield item if first else "," + item
+                    first = False
+            yield "]"
+
+        return StreamingResponse(database_array(), media_type="application/json")
+
+    result = await session.execute(query.limit(limit + 1))
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_keyset_cursor(
+            rows[-1].created_at, rows[-1].id
+        )
+    return [describe_database_row(row) for row in rows]
 
 
 @app.get("/databases/{database_id}")
@@ -165,6 +345,20 @@ async def get_database(database_id: str, session: AsyncSession = Depends(get_db)
             select(Database).where(Database.id == database_id)
         )
         database = result.scalar_one()
+
+        # Fetch the remote parts concurrently, a slow part only degrades its field
+        parts, errors = await gather_parts(
+            {
+                "instance_status": get_instance_status(database.db_instance_id),
+                "stats_status": refresh_instance_stats(database.db_instance_id),
+                "linode_details": get_linode_instance_details(database.db_instance_id),
+                "firewall_details": get_firewall(firewall_id=database.firewall_id),
+            },
+            timeout=settings.fanout_part_timeout,
+            timeouts={"stats_status": settings.fanout_stats_timeout},
+        )
+        stats = parts.get("stats_status")
+
         return {
             "database_id": database.id,
             "database_name": get_instance_name_from_label(database.db_name),
@@ -172,12 +366,12 @@ async def get_database(database_id: str, session: AsyncSession = Depends(get_db)
             "region": database.region,
             "created_at": database.created_at,
             "updated_at": database.updated_at,
-            "instance_status": get_instance_status(database.db_instance_id),
-            "stats_status": get_linode_stats(database.db_instance_id).get(
-                "status", False
-            ),
-            "linode_details": get_linode_instance_details(database.db_instance_id),
-            "firewall_details": get_firewall(firewall_id=database.firewall_id),
+            "instance_status": parts.get("instance_status"),
+            "stats_status": stats.get("status", False) if stats else False,
+            "linode_details": parts.get("linode_details"),
+            "firewall_details": parts.get("firewall_details"),
+            "partial": bool(errors),
+            "errors": errors,
         }
     except NoResultFound:
         raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
@@ -185,21 +379,37 @@ async def get_database(database_id: str, session: AsyncSession = Depends(get_db)
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error retrieving database: {str(e.with_traceback())}",
+            detail=f"Error retrieving database: {str(e)}",
         )
 
 
 @app.delete("/databases/{database_id}")
-async def delete_database(database_id: str, session: AsyncSession = Depends(get_db)):
+async def delete_database(
+    database_id: str,
+    purge_backups: bool = False,
+    session: AsyncSession = Depends(get_db),
+):
     try:
         result = await session.execute(
             select(Database).where(Database.id == database_id)
         )
         database = result.scalar_one()
-        delete_linode_instance(database.db_instance_id)
+        await delete_linode_instance(database.db_instance_id)
+
+        # Backups left behind keep expiring through their retention tag
+        response = {"message": "Database deleted successfully"}
+        if purge_backups:
+            response["backups"] = await delete_database_backups(
+                user_id=database.user_id,
+                database_type=database.db_type,
+                db_id=database.id,
+            )
+
         await session.delete(database)
         await session.commit()
-        return {"message": "Database deleted successfully"}
+        firewall_index.remove_database(database_id)
+        stats_store.forget(database.db_instance_id)
+        return response
     except NoResultFound:
         raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
 
@@ -221,7 +431,7 @@ async def update_database(
             )
 
         # # update the instance type in linode
-        update_linode_instance(
+        await update_linode_instance(
             instance_name=db_update.database_name,
             instance_id=database.db_instance_id,
             instance_type=db_update.instance_type,
@@ -262,47 +472,112 @@ async def schedule_backup(
                 status_code=400, detail="Invalid backup schedule parameters."
             )
 
-        # Generate cron expression (assuming function is implemented)
+        if backup_request.compression_level is not None:
+            min_level, max_level = BACKUP_CODEC_LEVELS[backup_request.codec.value]
+            if not min_level <= backup_request.compression_level <= max_level:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{backup_request.codec.value} levels range from {min_level} to {max_level}.",
+                )
+
+        # Get the database instance
+        database = await session.get(Database, database_id)
+        if database is None:
+            raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+        # Spread the backups of the same hour over its minutes
+        try:
+            minute_offset, second_offset = await plan_backup_offset(
+                session,
+                database,
+                hour_of_day=backup_hour_of_day,
+                window_start_minute=backup_request.window_start_minute,
+                window_minutes=backup_request.window_minutes,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         cron_expression = convert_schedule_to_cron(
             hour_of_day=backup_hour_of_day,
             day_of_week=backup_day_of_week,
             day_of_month=backup_day_of_month,
             frequency=backup_frequency,
+            minute=minute_offset,
         )
 
-        # Get the database instance
-        database = await session.get(Database, database_id)
-
-        status = deploy_backup_script(
-            database_id=database_id,
-            user_id=database.user_id,
-            instance_id=database.db_instance_id,
-            cron_schedule=cron_expression,
-            db_type=database.db_type,
-            ssh_password=database.instance_root_password,
-            db_password=database.db_root_password,
-        )
+        # Rescheduling replaces the database's schedule and its crontab block
+        schedule_id = str(uuid4())
+        try:
+            status = await deploy_backup_script(
+                database_id=database_id,
+                schedule_id=schedule_id,
+                user_id=database.user_id,
+                instance_id=database.db_instance_id,
+                cron_schedule=cron_expression,
+                db_type=database.db_type,
+                ssh_password=database.instance_root_password,
+                db_password=database.db_root_password,
+                codec=backup_request.codec.value,
+                compression_level=backup_request.compression_level,
+                compression_threads=backup_request.compression_threads,
+                retention_days=backup_request.retention_days,
+                start_delay_seconds=second_offset,
+                # The service starts the backups itself when its scheduler is on
+                install_cron=not settings.backup_scheduler_enabled,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if status != 0:
+            raise HTTPException(
+                status_code=500, detail="Failed to deploy the backup script."
+            )
 
         # Create backup schedule
         new_backup_schedule = BackupSchedule(
-            id=str(uuid4()),
+            id=schedule_id,
             database_id=database_id,
             hour_of_day=backup_hour_of_day,
             day_of_week=backup_day_of_week,
             day_of_month=backup_day_of_month,
             frequency=backup_frequency,
             status=BackupStatus.SCHEDULED,
+            codec=backup_request.codec,
+            compression_level=backup_request.compression_level,
+            compression_threads=backup_request.compression_threads,
+            retention_days=backup_request.retention_days,
+            minute_offset=minute_offset,
+            second_offset=second_offset,
+            window_start_minute=backup_request.window_start_minute,
+            window_minutes=backup_request.window_minutes,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow(),
         )
         session.add(new_backup_schedule)
+        await session.execute(
+            delete(BackupSchedule).where(
+                BackupSchedule.database_id == database_id,
+                BackupSchedule.id != schedule_id,
+            )
+        )
         await session.commit()
 
+        # Expired backups are still removed by the sweeper if this fails
+        try:
+            retention_days = await apply_backup_retention(session, database)
+        except Exception as e:
+            print(f"Error applying backup retention of {database_id}: {e}")
+            retention_days = None
+
         return {
             "message": "Backup schedule created successfully",
             "schedule_id": new_backup_schedule.id,
             "status": status,
+            "retention_days": retention_days,
+            "minute_offset": minute_offset,
+            "second_offset": second_offset,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         await session.rollback()
         raise HTTPException(
@@ -310,17 +585,153 @@ async def schedule_backup(
         )
 
 
+def describe_backup_schedule(schedule: BackupSchedule) -> dict:
+    return {
+        "id": schedule.id,
+        "frequency": schedule.frequency,
+        "hour_of_day": schedule.hour_of_day,
+        "day_of_week": schedule.day_of_week,
+        "day_of_month": schedule.day_of_month,
+        "minute_offset": schedule.minute_offset,
+        "second_offset": schedule.second_offset,
+        "codec": schedule.codec,
+        "retention_days": schedule.retention_days,
+        "status": schedule.status.value if schedule.status else None,
+        "last_run_at": schedule.last_run_at,
+        "created_at": schedule.created_at,
+    }
+
+
+@app.get("/databases/{database_id}/backup_schedules")
+async def get_backup_schedules(
+    database_id: str, session: AsyncSession = Depends(get_db)
+):
+    """
+    The database's schedules and whether its crontab block matches them.
+    """
+    database = await session.get(Database, database_id)
+    if database is None:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+    result = await session.execute(
+        select(BackupSchedule)
+        .where(BackupSchedule.database_id == database_id)
+        .order_by(BackupSchedule.created_at)
+    )
+    try:
+        cron = await reconcile_backup_cron(session, database, repair=False)
+    except Exception as e:
+        cron = {"error": str(e)}
+
+    return {
+        "database_id": database_id,
+        "schedules": [
+            describe_backup_schedule(schedule) for schedule in result.scalars().all()
+        ],
+        "cron": cron,
+    }
+
+
+@app.post("/databases/{database_id}/backup_schedules/reconcile")
+async def reconcile_backup_schedules(
+    database_id: str, session: AsyncSession = Depends(get_db)
+):
+    database = await session.get(Database, database_id)
+    if database is None:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+    try:
+        return await reconcile_backup_cron(session, database)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error reconciling backup schedules: {str(e)}"
+        )
+
+
+@app.post("/backup_schedules/reconcile")
+async def reconcile_all_backup_schedules(repair: bool = True):
+    results = await reconcile_all_backup_cron(repair=repair)
+    return {
+        "databases": len(results),
+        "out_of_sync": sum(1 for result in results if not result.get("in_sync")),
+        "results": results,
+    }
+
+
+@app.delete("/databases/{database_id}/backup_schedules/{schedule_id}")
+async def delete_backup_schedule(
+    database_id: str, schedule_id: str, session: AsyncSession = Depends(get_db)
+):
+    database = await session.get(Database, database_id)
+    schedule = await session.get(BackupSchedule, schedule_id)
+    if database is None or schedule is None or schedule.database_id != database_id:
+        raise HTTPException(status_code=400, detail=BACKUP_SCHEDULE_NOT_FOUND_ERROR)
+
+    try:
+        await session.delete(schedule)
+        await session.commit()
+
+        # Rewrites the block from the remaining schedules
+        cron = await reconcile_backup_cron(session, database)
+        retention_days = await apply_backup_retention(session, database)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error deleting backup schedule: {str(e)}"
+        )
+
+    return {
+        "message": "Backup schedule deleted successfully",
+        "retention_days": retention_days,
+        "cron": cron,
+    }
+
+
 @app.get("/databases/{database_id}/stats")
-async def get_database_stats(database_id: str, session: AsyncSession = Depends(get_db)):
+async def get_database_stats(
+    database_id: str,
+    from_ts: Optional[int] = Query(None, alias="from"),
+    to_ts: Optional[int] = Query(None, alias="to"),
+    resolution: Optional[int] = Query(None, ge=STATS_MIN_RESOLUTION),
+    agg: str = Query("avg"),
+    metrics: Optional[str] = None,
+    session: AsyncSession = Depends(get_db),
+):
+    if agg not in STATS_AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported aggregation {agg}")
+
+    # 0 is a valid epoch bound, only a missing one takes the default
+    to_ts = to_ts if to_ts is not None else int(time.time())
+    from_ts = from_ts if from_ts is not None else to_ts - 24 * 3600
+    if from_ts >= to_ts:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if resolution is None:
+        span = to_ts - from_ts
+        resolution = max(STATS_MIN_RESOLUTION, -(-span // settings.stats_max_points))
+
     try:
 
         result = await session.execute(
             select(Database).where(Database.id == database_id)
         )
         database = result.scalar_one()
-        stats = get_linode_stats(database.db_instance_id)
+        status = await refresh_instance_stats(database.db_instance_id)
+        series = stats_store.query(
+            database.db_instance_id,
+            start=from_ts,
+            end=to_ts,
+            resolution=resolution,
+            agg=agg,
+            metrics=metrics.split(",") if metrics else None,
+        )
 
-        return stats
+        return {
+            **status,
+            "from": from_ts,
+            "to": to_ts,
+            "resolution": resolution,
+            "agg": agg,
+            "series": series,
+        }
 
     except NoResultFound:
         raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
@@ -339,20 +750,22 @@ async def get_database_health(
         )
         database = result.scalar_one()
 
-        stats = get_linode_stats(database.db_instance_id)
-        instance_status = get_instance_status(database.db_instance_id)
-
-        # NOTE implement later
-        # db_connection_status = check_connection_to_database(
-        #     db_type=database.db_type,
-        #     instance_id=database.db_instance_id,
-        #     password=database.db_root_password,
-        # )
+        parts, errors = await gather_parts(
+            {
+                "status": get_instance_status(database.db_instance_id),
+                "stats": get_instance_stats_summary(database.db_instance_id),
+                "db_connection_status": probe_database(database),
+            },
+            timeout=settings.fanout_part_timeout,
+            timeouts={"stats": settings.fanout_stats_timeout},
+        )
 
         return {
-            "status": instance_status,
-            "stats": stats,
-            # "db_connection_status": db_connection_status,
+            "status": parts.get("status"),
+            "stats": parts.get("stats"),
+            "db_connection_status": parts.get("db_connection_status"),
+            "partial": bool(errors),
+            "errors": errors,
         }
 
     except NoResultFound:
@@ -361,9 +774,192 @@ async def get_database_health(
         raise HTTPException(status_code=500, detail=f"Error retrieving stats: {str(e)}")
 
 
+@app.get("/health")
+async def get_fleet_health(
+    user_id: Optional[str] = None,
+    region: Optional[str] = None,
+    status: Optional[str] = None,
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Status of every database from a single listing of the account's
+    instances, joined in memory with the databases table.
+    """
+    query = select(
+        Database.id,
+        Database.user_id,
+        Database.db_name,
+        Database.region,
+        Database.db_instance_id,
+    ).order_by(Database.created_at, Database.id)
+    if user_id:
+        query = query.where(Database.user_id == user_id)
+    if region:
+        query = query.where(Database.region == region)
+
+    try:
+        result = await session.execute(query)
+        rows = result.all()
+        statuses = await list_instance_statuses()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error retrieving health: {str(e)}"
+        )
+
+    databases = []
+    counts = {}
+    for row in rows:
+        # Instances missing from the listing were deleted outside the API
+        instance_status = statuses.get(str(row.db_instance_id), "not_found")
+        if status and instance_status != status:
+            continue
+        counts[instance_status] = counts.get(instance_status, 0) + 1
+        databases.append(
+            {
+                "database_id": row.id,
+                "user_id": row.user_id,
+                "database_name": get_instance_name_from_label(row.db_name),
+                "region": row.region,
+                "instance_id": row.db_instance_id,
+                "instance_status": instance_status,
+            }
+        )
+
+    return {"total": len(databases), "counts": counts, "databases": databases}
+
+
+@app.get("/health/connections")
+async def get_fleet_connections(
+    user_id: Optional[str] = None,
+    region: Optional[str] = None,
+    refresh: bool = False,
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Probe the connectivity of every database concurrently, reusing recent
+    results unless refresh is set.
+    """
+    query = select(
+        Database.id,
+        Database.db_type,
+        Database.db_instance_id,
+        Database.db_root_password,
+        Database.region,
+    ).order_by(Database.created_at, Database.id)
+    if user_id:
+        query = query.where(Database.user_id == user_id)
+    if region:
+        query = query.where(Database.region == region)
+
+    result = await session.execute(query)
+    rows = result.all()
+    probes = await probe_databases(rows, use_cache=not refresh)
+
+    databases = [
+        {"database_id": row.id, "region": row.region, **probe}
+        for row, probe in zip(rows, probes)
+    ]
+    reachable = sum(1 for probe in probes if probe["status"])
+    return {
+        "total": len(databases),
+        "reachable": reachable,
+        "unreachable": len(databases) - reachable,
+        "databases": databases,
+    }
+
+
+def event_stream_response(subscription: Subscription) -> StreamingResponse:
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=settings.events_keepalive_interval,
+                    )
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                data = json.dumps(event, default=str)
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+        finally:
+            status_watcher.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/databases/{database_id}/events")
+async def get_database_events(
+    database_id: str, session: AsyncSession = Depends(get_db)
+):
+    result = await session.execute(
+        select(Database.db_instance_id).where(Database.id == database_id)
+    )
+    instance_id = result.scalar_one_or_none()
+    if instance_id is None:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+    return event_stream_response(status_watcher.subscribe({instance_id: database_id}))
+
+
+@app.get("/users/{user_id}/events")
+async def get_user_events(user_id: str, session: AsyncSession = Depends(get_db)):
+    result = await session.execute(
+        select(Database.id, Database.db_instance_id).where(Database.user_id == user_id)
+    )
+    targets = {row.db_instance_id: row.id for row in result.all()}
+    return event_stream_response(status_watcher.subscribe(targets))
+
+
+@app.post("/databases/{database_id}/backups/benchmark")
+async def benchmark_backup_codecs(
+    database_id: str,
+    sample_mb: int = Query(256, ge=1, le=4096),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Run every available codec against a sample dump on the instance, to pick
+    the codec of the backup schedule.
+    """
+    database = await session.get(Database, database_id)
+    if database is None:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+    try:
+        results = await run_codec_benchmark(
+            instance_id=database.db_instance_id,
+            ssh_password=database.instance_root_password,
+            db_password=database.db_root_password,
+            sample_mb=sample_mb,
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error benchmarking codecs: {str(e)}"
+        )
+
+    return {
+        "database_id": database_id,
+        "instance_type": database.instance_type,
+        "sample_mb": sample_mb,
+        "results": results,
+    }
+
+
 @app.get("/databases/{database_id}/backups")
 async def get_database_backups(
-    database_id: str, session: AsyncSession = Depends(get_db)
+    database_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    source: str = Query("catalog", pattern="^(catalog|storage)$"),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_db),
 ):
     try:
 
@@ -372,22 +968,190 @@ async def get_database_backups(
         )
         database = result.scalar_one()
 
-        backups = get_backups(
-            database_type=database.db_type,
+        if source == "catalog" and not stream:
+            return await list_catalog_backups(
+                session,
+                limit=limit,
+                cursor=cursor,
+                database_ids=[database.id],
+                from_date=from_date,
+                to_date=to_date,
+            )
+
+        if stream:
+            # NDJSON, one backup per line, written as listing pages arrive
+            pages = iter_backup_pages(
+                user_id=database.user_id,
+                database_type=database.db_type,
+                db_id=database.id,
+                from_date=from_date,
+                to_date=to_date,
+            )
+
+            async def backup_lines():
+                async for page in iterate_blocking(OBJECT_STORAGE_POOL, pages):
+                    yield "".join(
+                        json.dumps(backup, default=str) + "\n" for backup in page
+                    )
+
+            return StreamingResponse(backup_lines(), media_type="application/x-ndjson")
+
+        return await list_backups_page(
             user_id=database.user_id,
+            database_type=database.db_type,
             db_id=database.id,
+            limit=limit,
+            cursor=cursor,
+            from_date=from_date,
+            to_date=to_date,
         )
 
-        return {"backups": backups}
-
     except NoResultFound:
         raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error retrieving backups: {str(e)}"
         )
 
 
+@app.post("/databases/{database_id}/backups/sync")
+async def sync_database_backups(
+    database_id: str, full: bool = False, session: AsyncSession = Depends(get_db)
+):
+    try:
+        database = await session.get(Database, database_id)
+        if database is None:
+            raise NoResultFound()
+        return await sync_backup_catalog(session, database, full=full)
+    except NoResultFound:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error syncing backups: {str(e)}")
+
+
+@app.get("/databases/{database_id}/backup_runs")
+async def get_database_backup_runs(
+    database_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[BackupStatus] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    session: AsyncSession = Depends(get_db),
+):
+    database = await session.get(Database, database_id)
+    if database is None:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+    try:
+        return await list_backup_runs(
+            session,
+            database_id,
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            from_date=from_date,
+            to_date=to_date,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error retrieving backup runs: {str(e)}"
+        )
+
+
+@app.get("/databases/{database_id}/backup_runs/trends")
+async def get_database_backup_run_trends(
+    database_id: str,
+    days: int = Query(30, ge=1, le=365),
+    session: AsyncSession = Depends(get_db),
+):
+    database = await session.get(Database, database_id)
+    if database is None:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+
+    try:
+        return await get_backup_run_trends(session, database_id, days=days)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error computing backup run trends: {str(e)}"
+        )
+
+
+@app.post("/databases/{database_id}/backup_runs/ingest")
+async def ingest_database_backup_logs(
+    database_id: str, full: bool = False, session: AsyncSession = Depends(get_db)
+):
+    try:
+        database = await session.get(Database, database_id)
+        if database is None:
+            raise NoResultFound()
+        return await ingest_backup_logs(session, database, full=full)
+    except NoResultFound:
+        raise HTTPException(status_code=400, detail=DATABASE_NOT_FOUND_ERROR)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error ingesting backup logs: {str(e)}"
+        )
+
+
+@app.get("/backups/")
+async def list_backups_endpoint(
+    user_id: Optional[str] = None,
+    database_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_db),
+):
+    try:
+        return await list_catalog_backups(
+            session,
+            limit=limit,
+            cursor=cursor,
+            database_ids=[database_id] if database_id else None,
+            user_id=user_id,
+            from_date=from_date,
+            to_date=to_date,
+            min_size=min_size,
+            max_size=max_size,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/backups/summary")
+async def summarize_backups_endpoint(
+    user_id: Optional[str] = None,
+    database_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    session: AsyncSession = Depends(get_db),
+):
+    databases = await summarize_catalog_backups(
+        session,
+        database_ids=[database_id] if database_id else None,
+        user_id=user_id,
+        from_date=from_date,
+        to_date=to_date,
+        min_size=min_size,
+        max_size=max_size,
+    )
+    return {
+        "count": sum(d["count"] for d in databases),
+        "total_size": sum(d["total_size"] for d in databases),
+        "databases": databases,
+    }
+
+
 @app.delete("/backups")
 async def delete_database_backup(
     request: DatabaseBackupDeleteRequest,
@@ -395,9 +1159,11 @@ async def delete_database_backup(
 ):
 
     try:
-        status = delete_backup(
+        status = await delete_backup(
             backup_id=request.backup_id,
         )
+        if status:
+            await remove_from_catalog(session, [request.backup_id])
 
         return {"status": status}
     except NoResultFound:
@@ -406,11 +1172,58 @@ async def delete_database_backup(
         raise HTTPException(status_code=500, detail=f"Error deleting backup: {str(e)}")
 
 
+@app.delete("/backups/bulk")
+async def delete_database_backups_bulk(
+    request: DatabaseBackupBulkDeleteRequest, session: AsyncSession = Depends(get_db)
+):
+    try:
+        result = await delete_backups(backup_ids=request.backup_ids)
+        await remove_from_catalog(
+            session, [key for key in request.backup_ids if key not in result["failed"]]
+        )
+        return {"status": not result["failed"], **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting backups: {str(e)}")
+
+
+@app.post("/backups/retention/sweep")
+async def sweep_expired_backups_endpoint(session: AsyncSession = Depends(get_db)):
+    try:
+        result = await sweep_expired_backups(session)
+        return {"status": not result["failed"], **result}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error sweeping expired backups: {str(e)}"
+        )
+
+
 @app.get("/firewalls/")
-async def list_firewalls_endpoint(user_id: str = None, db_id: str = None):
+async def list_firewalls_endpoint(
+    user_id: str = None, db_id: str = None, session: AsyncSession = Depends(get_db)
+):
     try:
-        firewalls = list_firewalls(user_id=user_id, db_id=db_id)
-        return {"firewalls": firewalls}
+        if not user_id and not db_id:
+            firewalls = await list_firewalls()
+            return {"firewalls": firewalls}
+
+        # Answered from the local index, without listing the account
+        if db_id:
+            entry = await firewall_index.lookup_database(session, db_id)
+            entries = [entry] if entry else []
+        else:
+            await firewall_index.refresh(session)
+            entries = firewall_index.get_user(user_id)
+        if user_id:
+            entries = [entry for entry in entries if entry["user_id"] == user_id]
+
+        firewalls, errors = await gather_parts(
+            {
+                entry["firewall_id"]: get_firewall(firewall_id=entry["firewall_id"])
+                for entry in entries
+            },
+            timeout=settings.fanout_part_timeout,
+        )
+        return {"firewalls": list(firewalls.values()), "errors": errors}
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error listing firewalls: {str(e)}"
@@ -420,7 +1233,7 @@ async def list_firewalls_endpoint(user_id: str = None, db_id: str = None):
 @app.get("/firewalls/{firewall_id}")
 async def get_firewall_endpoint(firewall_id: int):
     try:
-        firewall = get_firewall(firewall_id)
+        firewall = await get_firewall(firewall_id)
         return {"firewall": firewall}
     except Exception as e:
         raise HTTPException(
@@ -448,7 +1261,7 @@ async def update_firewall_endpoint(
                 status_code=400, detail="Invalid firewall rules provided"
             )
 
-        firewall = update_firewall(
+        firewall = await update_firewall(
             firewall_id=database.firewall_id,
             rules=rules,
         )
@@ -462,8 +1275,9 @@ async def update_firewall_endpoint(
 @app.delete("/firewalls/{firewall_id}")
 async def delete_firewall_endpoint(firewall_id: int):
     try:
-        success = delete_firewall(firewall_id)
+        success = await delete_firewall(firewall_id)
         if success:
+            firewall_index.remove_firewall(firewall_id)
             return {"message": "Firewall deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail="Error deleting firewall")
@@ -473,6 +1287,154 @@ async def delete_firewall_endpoint(firewall_id: int):
         )
 
 
+def collect_runtime_metrics():
+    executor_stats = get_executor_stats()
+    cache_stats = linode_cache.stats()
+    pool_stats = get_pool_stats()
+    ssh_stats = ssh_pool.stats()
+
+    def per_pool(name, metric_type, documentation, field):
+        samples = [
+            ({"pool": pool}, stats[field]) for pool, stats in executor_stats.items()
+        ]
+        return (name, metric_type, documentation, samples)
+
+    def single(name, metric_type, documentation, value):
+        return (name, metric_type, documentation, [({}, value)])
+
+    return [
+        per_pool(
+            "executor_queue_depth",
+            "gauge",
+            "Calls waiting for a worker.",
+            "queue_depth",
+        ),
+        per_pool("executor_active", "gauge", "Calls running on a worker.", "active"),
+        per_pool(
+            "executor_expired_total",
+            "counter",
+            "Calls dropped because their deadline passed while queued.",
+            "expired",
+        ),
+        per_pool(
+            "executor_wait_seconds_avg",
+            "gauge",
+            "Average wait for a worker.",
+            "avg_wait_seconds",
+        ),
+        per_pool(
+            "executor_wait_seconds_max",
+            "gauge",
+            "Longest wait for a worker.",
+            "max_wait_seconds",
+        ),
+        single(
+            "linode_cache_hits_total",
+            "counter",
+            "Linode cache hits.",
+            cache_stats["hits"],
+        ),
+        single(
+            "linode_cache_misses_total",
+            "counter",
+            "Linode cache misses.",
+            cache_stats["misses"],
+        ),
+        single(
+            "linode_cache_request_hits_total",
+            "counter",
+            "Loads served by the request memo.",
+            cache_stats["request_hits"],
+        ),
+        single(
+            "linode_cache_entries",
+            "gauge",
+            "Objects in the Linode cache.",
+            cache_stats["entries"],
+        ),
+        single(
+            "db_pool_checked_out",
+            "gauge",
+            "Connections checked out of the pool.",
+            pool_stats.get("checked_out", 0),
+        ),
+        single(
+            "db_pool_utilization",
+            "gauge",
+            "Checked out connections over capacity.",
+            pool_stats.get("utilization", 0.0),
+        ),
+        single(
+            "db_pool_checkout_wait_seconds_avg",
+            "gauge",
+            "Average wait for a connection.",
+            pool_stats["avg_checkout_wait_seconds"],
+        ),
+        single(
+            "db_pool_checkout_wait_seconds_max",
+            "gauge",
+            "Longest wait for a connection.",
+            pool_stats["max_checkout_wait_seconds"],
+        ),
+        single(
+            "db_pool_checkout_timeouts_total",
+            "counter",
+            "Checkouts that timed out.",
+            pool_stats["checkout_timeouts"],
+        ),
+        single(
+            "ssh_pool_open", "gauge", "Open pooled SSH connections.", ssh_stats["open"]
+        ),
+        single(
+            "ssh_pool_idle", "gauge", "Idle pooled SSH connections.", ssh_stats["idle"]
+        ),
+        single(
+            "provisioning_queue_depth",
+            "gauge",
+            "Provisioning jobs waiting.",
+            provisioning_workers.stats()["queue_depth"],
+        ),
+    ]
+
+
+registry.add_collector(collect_runtime_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/internal/executors")
+async def get_executors_endpoint():
+    return {
+        "executors": get_executor_stats(),
+        "provisioning": provisioning_workers.stats(),
+        "ssh_pool": ssh_pool.stats(),
+        "backup_ssh_pool": backup_ssh_pool.stats(),
+        "stats_store": stats_store.stats(),
+        "status_watcher": status_watcher.stats(),
+        "backup_scheduler": backup_scheduler.stats(),
+    }
+
+
+@app.get("/internal/db_pool")
+async def get_db_pool_endpoint():
+    return get_pool_stats()
+
+
+@app.get("/internal/firewall_index")
+async def get_firewall_index_endpoint():
+    return firewall_index.stats()
+
+
+@app.get("/internal/cache")
+async def get_cache_endpoint():
+    return {"linode": linode_cache.stats(), "db_probe": probe_cache.stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
 
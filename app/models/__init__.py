@@ -1,5 +1,6 @@
 # app/models/__init__.py
 from app.models.user import User
 from app.models.database import Database
-from app.models.backups import BackupSchedule
+from app.models.backups import BackupSchedule, Backup, BackupSyncState, BackupRun
+from app.models.jobs import ProvisioningJob
 # Ensure all models are imported so they are registered with Base.metadata
\ No newline at end of file
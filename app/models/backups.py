@@ -5,12 +5,17 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     Integer,
+    BigInteger,
+    Float,
+    Text,
+    Index,
     Enum as SQLAlchemyEnum,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.models.base import Base
-from app.constants.enums import BackupStatus, BackupSchedule
+from app.constants.enums import BackupStatus, BackupSchedule, BackupCodec
+from app.constants.contants import DEFAULT_BACKUP_RETENTION_DAYS
 
 
 class BackupSchedule(Base):
@@ -35,7 +40,91 @@ class BackupSchedule(Base):
     status = Column(
         SQLAlchemyEnum(BackupStatus), nullable=False, default=BackupStatus.SCHEDULED
     )
+    codec = Column(
+        SQLAlchemyEnum(BackupCodec), nullable=False, default=BackupCodec.gzip
+    )  # Compression of the backups
+    compression_level = Column(Integer, nullable=True)
+    compression_threads = Column(Integer, nullable=False, default=0)
+    retention_days = Column(
+        Integer, nullable=False, default=DEFAULT_BACKUP_RETENTION_DAYS
+    )  # Days the backups are kept
+    minute_offset = Column(
+        Integer, nullable=False, default=0
+    )  # Planned start inside the hour, spreads backups over the hour
+    second_offset = Column(Integer, nullable=False, default=0)
+    window_start_minute = Column(Integer, nullable=False, default=0)
+    window_minutes = Column(Integer, nullable=False, default=60)
+    last_run_at = Column(
+        DateTime, nullable=True
+    )  # Fire time of the last run started by the control plane scheduler
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     database = relationship("Database", back_populates="backup_schedules")
+
+
+class Backup(Base):
+    # Catalog of the backup objects in object storage, kept up to date by
+    # app.utils.backup_catalog.sync_backup_catalog
+    __tablename__ = "backups"
+    __table_args__ = (
+        Index("ix_backups_database_id_created_at", "database_id", "created_at"),
+    )
+
+    id = Column(String(64), primary_key=True)  # sha256 of the object key
+    database_id = Column(
+        String(64), ForeignKey("databases.id", ondelete="CASCADE"), nullable=False
+    )
+    key = Column(String(512), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(
+        DateTime, nullable=False
+    )  # Backup time from the object key, last_modified if the key has none
+    last_modified = Column(DateTime, nullable=False)
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BackupSyncState(Base):
+    __tablename__ = "backup_sync_states"
+
+    prefix = Column(String(255), primary_key=True)
+    database_id = Column(
+        String(64),
+        ForeignKey("databases.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    watermark = Column(String(512), nullable=True)  # Last object key synced
+    synced_at = Column(DateTime, nullable=True)
+
+
+class BackupRun(Base):
+    # One execution of the backup script
+    __tablename__ = "backup_runs"
+    __table_args__ = (
+        Index("ix_backup_runs_database_id_started_at", "database_id", "started_at"),
+    )
+
+    id = Column(String(64), primary_key=True)
+    database_id = Column(
+        String(64), ForeignKey("databases.id", ondelete="CASCADE"), nullable=False
+    )
+    schedule_id = Column(
+        String(64),
+        ForeignKey("backup_schedules.id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    status = Column(
+        SQLAlchemyEnum(BackupStatus), nullable=False, default=BackupStatus.RUNNING
+    )
+    scheduled_for = Column(DateTime, nullable=True)  # Fire time of the schedule
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    bytes = Column(BigInteger, nullable=True)  # Size of the uploaded backup
+    upload_seconds = Column(Float, nullable=True)
+    codec = Column(String(16), nullable=True)
+    mode = Column(String(16), nullable=True)  # "stream" or "file", as it ran
+    key = Column(String(512), nullable=True)  # Object key of the backup
+    log_key = Column(String(512), nullable=True)  # Run log it was ingested from
+    error = Column(Text, nullable=True)
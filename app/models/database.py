@@ -5,6 +5,7 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     Integer,
+    Index,
     Enum as SQLAlchemyEnum,
 )
 from sqlalchemy.orm import relationship
@@ -15,6 +16,14 @@ from app.constants.enums import DatabaseType, InstanceType, Region
 
 class Database(Base):
     __tablename__ = "databases"
+    __table_args__ = (
+        # Keyset pagination of a user's databases
+        Index("ix_databases_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Keyset pagination of every database, for listings without a user
+        Index("ix_databases_created_at_id", "created_at", "id"),
+        # Incremental refreshes of the firewall index
+        Index("ix_databases_updated_at", "updated_at"),
+    )
 
     id = Column(String(36), primary_key=True, index=True)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
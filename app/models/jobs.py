@@ -0,0 +1,47 @@
+# app/models/jobs.py
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Integer,
+    Text,
+    JSON,
+    Enum as SQLAlchemyEnum,
+)
+from datetime import datetime
+from app.models.base import Base
+from app.constants.enums import JobStatus, ProvisioningStep
+
+
+class ProvisioningJob(Base):
+    __tablename__ = "provisioning_jobs"
+
+    id = Column(String(36), primary_key=True, index=True)
+    user_id = Column(String(36), nullable=False, index=True)
+    database_id = Column(String(36), nullable=False)  # Id of the Database row to create
+    request = Column(JSON, nullable=False)  # DatabaseRequest payload
+    status = Column(
+        SQLAlchemyEnum(JobStatus), nullable=False, default=JobStatus.queued, index=True
+    )
+    step = Column(
+        SQLAlchemyEnum(ProvisioningStep),
+        nullable=False,
+        default=ProvisioningStep.pending,
+    )  # Last step that completed, the job resumes after it
+
+    # Step results
+    instance_label = Column(String(100), nullable=False)
+    instance_root_password = Column(String(100), nullable=False)
+    db_root_password = Column(String(100), nullable=False)
+    instance_id = Column(String(100), nullable=True)
+    firewall_id = Column(String(100), nullable=True)
+    firewall_status = Column(JSON, nullable=True)
+
+    # Lease of the run executing the job, renewed after every step
+    claimed_by = Column(String(36), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
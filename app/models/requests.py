@@ -1,8 +1,15 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from uuid import UUID
-from app.constants.enums import DatabaseType, InstanceType, Region, BackupSchedule
+from app.constants.enums import (
+    DatabaseType,
+    InstanceType,
+    Region,
+    BackupSchedule,
+    BackupCodec,
+)
 from typing import Dict, Any, List
+from app.constants.contants import DEFAULT_BACKUP_RETENTION_DAYS
 
 
 class DatabaseRequest(BaseModel):
@@ -16,6 +23,10 @@ class DatabaseRequest(BaseModel):
     backup_schedule: Optional[BackupSchedule] = None  # Backup schedule
 
 
+class BulkDatabaseRequest(BaseModel):
+    items: List[DatabaseRequest] = Field(..., min_length=1, max_length=100)
+
+
 class DatabaseBackupRequest(BaseModel):
     user_id: str
     database_id: str
@@ -25,6 +36,13 @@ class DatabaseBackupRequest(BaseModel):
         None  # Optional, for only present for monthly frequency
     )
     frequency: BackupSchedule
+    codec: BackupCodec = BackupCodec.gzip
+    compression_level: Optional[int] = None  # The codec's default when empty
+    compression_threads: int = Field(0, ge=0)  # pigz and zstd, 0 uses every core
+    retention_days: int = Field(DEFAULT_BACKUP_RETENTION_DAYS, ge=1, le=3650)
+    # Minutes of the hour the backup may start in, it is planned inside them
+    window_start_minute: int = Field(0, ge=0, le=59)
+    window_minutes: int = Field(60, ge=1, le=60)
 
 
 class DatabaseUpdateRequest(BaseModel):
@@ -59,6 +77,10 @@ class DatabaseBackupDeleteRequest(BaseModel):
     backup_id: str
 
 
+class DatabaseBackupBulkDeleteRequest(BaseModel):
+    backup_ids: List[str] = Field(..., min_length=1, max_length=10000)
+
+
 class FirewallRequest(BaseModel):
     label: str
     rules: Dict[str, Any]
@@ -0,0 +1,229 @@
+import copy
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from email.utils import parsedate_to_datetime
+from linode_api4 import LinodeClient
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import Timeout
+from app.utils.executors import call_deadline
+from app.utils.metrics import (
+    linode_api_throttled,
+    linode_api_retries,
+    linode_api_coalesced,
+    linode_api_rate_limit_wait,
+)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second with bursts of up to
+    `capacity` requests.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, sleeping until one is available. Returns the time waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self, seconds: float):
+        # After a 429 hold every caller back, not only the one that got it
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[Response] = None
+        self.error: Optional[BaseException] = None
+
+
+def _retry_after(response: Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _coalescing_key(request) -> Tuple:
+    # Every header takes part: linode_api4 sends list filters in X-Filter, so
+    # the same URL can return different bodies
+    headers = tuple(
+        sorted((name.lower(), value) for name, value in request.headers.items())
+    )
+    return (request.method, request.url, headers, request.body)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    Transport adapter for the Linode API session that paces requests with a
+    token bucket, retries 429s and transient 5xx responses with jittered
+    exponential backoff honoring Retry-After, and coalesces concurrent
+    identical GETs into one request. Every attempt has a timeout, and the
+    deadline of the awaiting part (see gather_parts) bounds the attempts and
+    retries, so a worker isn't held after its caller gave up.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        request_timeout: float,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        self.request_timeout = request_timeout
+        self.retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight: Dict[Tuple, _InFlight] = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retrying callers from moving in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _remaining(self, deadline: Optional[float], path: str) -> Optional[float]:
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise Timeout(f"Linode API {path} gave up, its caller timed out")
+        return remaining
+
+    def _send_with_retries(self, request, **kwargs) -> Response:
+        path = request.path_url.split("?")[0]
+        # Attempts and retries stop at the deadline of the awaiting part
+        deadline = call_deadline.get()
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            if waited:
+                linode_api_throttled.inc(reason="client")
+                linode_api_rate_limit_wait.observe(waited)
+
+            timeout = kwargs.get("timeout") or self.request_timeout
+            remaining = self._remaining(deadline, path)
+            if remaining is not None:
+                # A (connect, read) tuple is replaced, both are bounded anyway
+                timeout = (
+                    remaining if isinstance(timeout, tuple) else min(timeout, remaining)
+                )
+            response = super().send(request, **{**kwargs, "timeout": timeout})
+            status = response.status_code
+            retryable = status == 429 or (
+                status in RETRY_STATUSES and request.method in IDEMPOTENT_METHODS
+            )
+            if not retryable or attempt >= self.retries:
+                return response
+
+            delay = _retry_after(response)
+            if status == 429:
+                linode_api_throttled.inc(reason="server")
+                if delay is not None:
+                    self.bucket.drain(delay)
+            if delay is None:
+                delay = self._backoff(attempt)
+            delay = min(delay, self.backoff_max)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                return response
+
+            linode_api_retries.inc(status=status)
+            print(f"Linode API {request.method} {path} returned {status}, retrying")
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def send(self, request, stream=False, **kwargs) -> Response:
+        if request.method != "GET" or stream:
+            return self._send_with_retries(request, stream=stream, **kwargs)
+
+        key = _coalescing_key(request)
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[key] = _InFlight()
+
+        if not leader:
+            linode_api_coalesced.inc()
+            path = request.path_url.split("?")[0]
+            if not in_flight.done.wait(self._remaining(call_deadline.get(), path)):
+                raise Timeout(f"Linode API {path} gave up, its caller timed out")
+            if in_flight.error is not None:
+                raise in_flight.error
+            return copy.copy(in_flight.response)
+
+        try:
+            response = self._send_with_retries(request, stream=stream, **kwargs)
+            # Read the body now so followers get a complete copy
+            response.content
+            in_flight.response = response
+            return response
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.done.set()
+
+
+def create_linode_client(
+    token: str,
+    requests_per_minute: int,
+    burst: int,
+    max_retries: int,
+    backoff_base: float,
+    backoff_max: float,
+    request_timeout: float,
+) -> LinodeClient:
+    client = LinodeClient(token)
+    adapter = RateLimitedAdapter(
+        TokenBucket(requests_per_minute / 60, burst),
+        max_retries=max_retries,
+        backoff_base=backoff_base,
+        backoff_max=backoff_max,
+        request_timeout=request_timeout,
+    )
+    # Replaces the session's default adapters, retries are handled here
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    return client
@@ -1,10 +1,36 @@
-from linode_api4 import LinodeClient, Instance, Firewall
+from linode_api4 import Instance, Firewall
 from app.config import settings
-import paramiko
+from app.resources.linode_client import create_linode_client
+from app.utils.cache import TTLCache
+from app.utils.ssh import SSHConnectionPool
 import boto3
 
-client = LinodeClient(settings.linode_token)
-ssh_client = paramiko.SSHClient()
+client = create_linode_client(
+    settings.linode_token,
+    requests_per_minute=settings.linode_api_requests_per_minute,
+    burst=settings.linode_api_burst,
+    max_retries=settings.linode_api_max_retries,
+    backoff_base=settings.linode_api_backoff_base,
+    backoff_max=settings.linode_api_backoff_max,
+    request_timeout=settings.linode_api_request_timeout,
+)
+ssh_pool = SSHConnectionPool(
+    max_per_host=settings.ssh_pool_max_per_host,
+    idle_timeout=settings.ssh_pool_idle_timeout,
+    keepalive_interval=settings.ssh_keepalive_interval,
+    connect_timeout=settings.ssh_connect_timeout,
+    checkout_timeout=settings.ssh_checkout_timeout,
+)
+# Scheduled backups keep their connection for the whole run, a pool of their
+# own leaves the connections of deploys and cron reconciliation free
+backup_ssh_pool = SSHConnectionPool(
+    max_per_host=settings.ssh_pool_max_per_host,
+    idle_timeout=settings.ssh_pool_idle_timeout,
+    keepalive_interval=settings.ssh_keepalive_interval,
+    connect_timeout=settings.ssh_connect_timeout,
+    checkout_timeout=settings.ssh_checkout_timeout,
+)
+linode_cache = TTLCache("linode", settings.linode_cache_max_entries)
 
 linode_obj_config = {
     "aws_access_key_id": settings.linode_db_backup_bucket_access_key,
@@ -1,28 +1,20 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy import select, exists, text
 from app.models.base import Base
 from app.models.user import User
+import app.models  # Registers every model with Base.metadata
 from app.config import settings
-from app.utils.db import get_db
-
-DATABASE_URL = f"mysql+aiomysql://{settings.db_user}:{settings.db_password}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
-
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+from app.utils.db import init_engine, dispose_engine, async_session_maker
 
 async def create_db_and_tables():
-    async with engine.begin() as conn:
+    async with init_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    await engine.dispose()
-
 async def drop_db_and_tables():
-    async with engine.begin() as conn:
+    async with init_engine().begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
-    await engine.dispose()
 
 async def seed_initial_data():
+    init_engine()
     async with async_session_maker() as session:
         async with session.begin():
             # Check if initial data exists
@@ -40,18 +32,17 @@ async def seed_initial_data():
                     is_superuser=True
                 )
                 session.add(user)
-    await engine.dispose()
 
 async def apply_migrations():
-    async with engine.begin() as conn:
+    async with init_engine().begin() as conn:
         await conn.execute(text("CREATE TABLE IF NOT EXISTS test_table (id INT PRIMARY KEY AUTO_INCREMENT, name VARCHAR(255))"))
-    await engine.dispose()
 
 async def main():
     await drop_db_and_tables()
     await create_db_and_tables()
     await seed_initial_data()
     await apply_migrations()
+    await dispose_engine()
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,63 @@
+# app/utils/async_linode.py
+# Async facade over app/utils/linode.py. Every helper that talks to the Linode
+# API, object storage or an instance over SSH is run on its own bounded pool so
+# a slow upstream never blocks the event loop.
+from app.utils import linode
+from app.utils.executors import (
+    offload,
+    LINODE_API_POOL,
+    OBJECT_STORAGE_POOL,
+    SSH_POOL,
+    BACKUP_RUN_POOL,
+)
+
+# Pure helpers, nothing to offload
+get_unique_instance_name = linode.get_unique_instance_name
+get_instance_name_from_label = linode.get_instance_name_from_label
+get_backup_script_content = linode.get_backup_script_content
+validate_firewall_rules = linode.validate_firewall_rules
+get_backup_command = linode.get_backup_command
+parse_backup_summary = linode.parse_backup_summary
+
+# Linode API
+get_server_ip = offload(LINODE_API_POOL)(linode.get_server_ip)
+create_linode_instance = offload(LINODE_API_POOL)(linode.create_linode_instance)
+find_linode_instance_by_label = offload(LINODE_API_POOL)(
+    linode.find_linode_instance_by_label
+)
+get_instance_status = offload(LINODE_API_POOL)(linode.get_instance_status)
+list_instance_statuses = offload(LINODE_API_POOL)(linode.list_instance_statuses)
+get_linode_stats = offload(LINODE_API_POOL)(linode.get_linode_stats)
+update_linode_instance = offload(LINODE_API_POOL)(linode.update_linode_instance)
+delete_linode_instance = offload(LINODE_API_POOL)(linode.delete_linode_instance)
+get_linode_instance_details = offload(LINODE_API_POOL)(
+    linode.get_linode_instance_details
+)
+add_instance_to_firewall = offload(LINODE_API_POOL)(linode.add_instance_to_firewall)
+create_firewall = offload(LINODE_API_POOL)(linode.create_firewall)
+find_firewall_by_label = offload(LINODE_API_POOL)(linode.find_firewall_by_label)
+list_firewalls = offload(LINODE_API_POOL)(linode.list_firewalls)
+get_firewall = offload(LINODE_API_POOL)(linode.get_firewall)
+update_firewall = offload(LINODE_API_POOL)(linode.update_firewall)
+delete_firewall = offload(LINODE_API_POOL)(linode.delete_firewall)
+
+# Object storage
+delete_all_objects_from_folder = offload(OBJECT_STORAGE_POOL)(
+    linode.delete_all_objects_from_folder
+)
+get_backups = offload(OBJECT_STORAGE_POOL)(linode.get_backups)
+list_backups_page = offload(OBJECT_STORAGE_POOL)(linode.list_backups_page)
+iter_backup_pages = linode.iter_backup_pages  # Consume with iterate_blocking
+delete_backup = offload(OBJECT_STORAGE_POOL)(linode.delete_backup)
+delete_backups = offload(OBJECT_STORAGE_POOL)(linode.delete_backups)
+set_retention_rules = offload(OBJECT_STORAGE_POOL)(linode.set_retention_rules)
+delete_database_backups = offload(OBJECT_STORAGE_POOL)(linode.delete_database_backups)
+iter_backup_log_pages = linode.iter_backup_log_pages  # Consume with iterate_blocking
+get_backup_log = offload(OBJECT_STORAGE_POOL)(linode.get_backup_log)
+
+# SSH
+deploy_backup_script = offload(SSH_POOL)(linode.deploy_backup_script)
+set_backup_cron = offload(SSH_POOL)(linode.set_backup_cron)
+list_backup_cron = offload(SSH_POOL)(linode.list_backup_cron)
+run_codec_benchmark = offload(SSH_POOL)(linode.run_codec_benchmark)
+run_backup_script = offload(BACKUP_RUN_POOL)(linode.run_backup_script)
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+from datetime import datetime, date, time, timezone
+from typing import List, Optional
+from sqlalchemy import func, delete
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.future import select
+from app.config import settings
+from app.models import Database, Backup, BackupSyncState
+from app.utils.db import async_session_maker
+from app.utils.pagination import encode_keyset_cursor, keyset_after
+from app.utils.executors import iterate_blocking, OBJECT_STORAGE_POOL
+from app.utils.linode import (
+    get_backup_folder,
+    get_backup_timestamp,
+    get_backup_codec,
+    iter_backup_pages,
+)
+
+
+def backup_catalog_id(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _catalog_row(database_id: str, backup: dict, synced_at: datetime) -> dict:
+    last_modified = _utc_naive(backup["last_modified"])
+    return {
+        "id": backup_catalog_id(backup["id"]),
+        "database_id": database_id,
+        "key": backup["id"],
+        "size": backup["size"],
+        "created_at": get_backup_timestamp(backup["id"]) or last_modified,
+        "last_modified": last_modified,
+        "synced_at": synced_at,
+    }
+
+
+def describe_backup(backup: Backup) -> dict:
+    return {
+        "id": backup.key,
+        "database_id": backup.database_id,
+        "created_at": backup.created_at,
+        "last_modified": backup.last_modified,
+        "size": backup.size,
+        "codec": get_backup_codec(backup.key),
+    }
+
+
+async def sync_backup_catalog(session, database: Database, full: bool = False) -> dict:
+    """
+    Bring the catalog of a database up to date with object storage. Backup
+    keys sort by time, so an incremental sync only lists the keys after the
+    watermark. A full sync lists everything and drops the rows whose objects
+    are gone.
+    """
+    prefix = get_backup_folder(database.user_id, database.db_type, database.id)
+    state = await session.get(BackupSyncState, prefix)
+    if state is None:
+        state = BackupSyncState(prefix=prefix, database_id=database.id)
+        session.add(state)
+
+    started_at = datetime.utcnow()
+    pages = iter_backup_pages(
+        user_id=database.user_id,
+        database_type=database.db_type,
+        db_id=database.id,
+        start_after=None if full else state.watermark,
+    )
+
+    added = 0
+    async for page in iterate_blocking(OBJECT_STORAGE_POOL, pages):
+        rows = [_catalog_row(database.id, backup, started_at) for backup in page]
+        statement = insert(Backup).values(rows)
+        await session.execute(
+            statement.on_duplicate_key_update(
+                size=statement.inserted.size,
+                last_modified=statement.inserted.last_modified,
+                synced_at=statement.inserted.synced_at,
+            )
+        )
+        added += len(rows)
+        # Commit page by page so an interrupted sync keeps its progress
+        state.watermark = page[-1]["id"]
+        await session.commit()
+
+    removed = 0
+    if full:
+        result = await session.execute(
+            delete(Backup).where(
+                Backup.database_id == database.id, Backup.synced_at < started_at
+            )
+        )
+        removed = result.rowcount
+
+    state.synced_at = started_at
+    await session.commit()
+    return {"synced": added, "removed": removed, "watermark": state.watermark}
+
+
+async def remove_from_catalog(session, keys: List[str]):
+    ids = [backup_catalog_id(key) for key in keys]
+    if ids:
+        await session.execute(delete(Backup).where(Backup.id.in_(ids)))
+        await session.commit()
+
+
+def _backup_filters(
+    database_ids: Optional[List[str]] = None,
+    user_id: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> list:
+    filters = []
+    if database_ids is not None:
+        filters.append(Backup.database_id.in_(database_ids))
+    if user_id:
+        filters.append(
+            Backup.database_id.in_(
+                select(Database.id).where(Database.user_id == user_id)
+            )
+        )
+    if from_date:
+        filters.append(Backup.created_at >= datetime.combine(from_date, time.min))
+    if to_date:
+        filters.append(Backup.created_at <= datetime.combine(to_date, time.max))
+    if min_size is not None:
+        filters.append(Backup.size >= min_size)
+    if max_size is not None:
+        filters.append(Backup.size <= max_size)
+    return filters
+
+
+async def list_catalog_backups(
+    session, limit: int = 100, cursor: str = None, **filters
+) -> dict:
+    """
+    Keyset-paginated listing on (created_at, id), served by the
+    (database_id, created_at) index.
+    """
+    conditions = _backup_filters(**filters)
+    if cursor:
+        conditions.append(keyset_after(Backup.created_at, Backup.id, cursor))
+
+    result = await session.execute(
+        select(Backup)
+        .where(*conditions)
+        .order_by(Backup.created_at, Backup.id)
+        .limit(limit + 1)
+    )
+    backups = result.scalars().all()
+
+    next_cursor = None
+    if len(backups) > limit:
+        backups = backups[:limit]
+        last = backups[-1]
+        next_cursor = encode_keyset_cursor(last.created_at, last.id)
+
+    return {
+        "backups": [describe_backup(backup) for backup in backups],
+        "next_cursor": next_cursor,
+    }
+
+
+async def summarize_catalog_backups(session, **filters) -> list:
+    result = await session.execute(
+        select(
+            Backup.database_id,
+            func.count(Backup.id),
+            func.sum(Backup.size),
+            func.min(Backup.created_at),
+            func.max(Backup.created_at),
+        )
+        .where(*_backup_filters(**filters))
+        .group_by(Backup.database_id)
+    )
+    return [
+        {
+            "database_id": database_id,
+            "count": count,
+            "total_size": int(total_size or 0),
+            "oldest": oldest,
+            "newest": newest,
+        }
+        for database_id, count, total_size, oldest, newest in result.all()
+    ]
+
+
+async def sync_all_backup_catalogs():
+    async with async_session_maker() as session:
+        result = await session.execute(select(Database))
+        databases = result.scalars().all()
+
+    semaphore = asyncio.Semaphore(settings.backup_catalog_sync_concurrency)
+
+    async def sync(database: Database):
+        async with semaphore:
+            async with async_session_maker() as session:
+                try:
+                    await sync_backup_catalog(session, database)
+                except Exception as e:
+                    print(f"Error syncing backup catalog of {database.id}: {e}")
+
+    await asyncio.gather(*(sync(database) for database in databases))
+
+
+async def run_backup_catalog_sync():
+    while True:
+        try:
+            await sync_all_backup_catalogs()
+        except Exception as e:
+            print(f"Error syncing backup catalogs: {e}")
+        await asyncio.sleep(settings.backup_catalog_sync_interval)
@@ -0,0 +1,128 @@
+import asyncio
+from typing import List, Tuple
+from sqlalchemy.future import select
+from app.config import settings
+from app.constants.enums import BackupCodec, BackupSchedule as BackupFrequency
+from app.models import Database, BackupSchedule
+from app.utils.db import async_session_maker, convert_schedule_to_cron
+from app.utils.crontab import backup_cron_line, describe_cron_line
+from app.utils.async_linode import (
+    get_backup_command,
+    set_backup_cron,
+    list_backup_cron,
+)
+
+
+def schedule_cron_entry(
+    database: Database, schedule: BackupSchedule
+) -> Tuple[str, str]:
+    """
+    The (schedule_id, cron line) a schedule row should be installed as.
+    """
+    cron_schedule = convert_schedule_to_cron(
+        hour_of_day=schedule.hour_of_day,
+        day_of_week=schedule.day_of_week,
+        day_of_month=schedule.day_of_month,
+        frequency=BackupFrequency(schedule.frequency).value,
+        minute=schedule.minute_offset or 0,
+    )
+    backup_command = get_backup_command(
+        database_id=database.id,
+        user_id=database.user_id,
+        instance_id=database.db_instance_id,
+        db_type=database.db_type,
+        db_password=database.db_root_password,
+        codec=BackupCodec(schedule.codec).value,
+        compression_level=schedule.compression_level,
+        compression_threads=schedule.compression_threads,
+        retention_days=schedule.retention_days,
+    )
+    return schedule.id, backup_cron_line(
+        cron_schedule, schedule.second_offset, backup_command
+    )
+
+
+async def reconcile_backup_cron(
+    session, database: Database, repair: bool = True
+) -> dict:
+    """
+    Compare the database's crontab block with its BackupSchedule rows, and
+    with `repair` rewrite the block so each row is installed exactly once.
+    The rows win: installed entries without a row are removed. With the
+    control plane scheduler on, no entry should be installed at all.
+    """
+    result = await session.execute(
+        select(BackupSchedule)
+        .where(BackupSchedule.database_id == database.id)
+        .order_by(BackupSchedule.created_at)
+    )
+    schedules = result.scalars().all()
+
+    entries: List[Tuple[str, str]] = []
+    if not settings.backup_scheduler_enabled:
+        entries = [schedule_cron_entry(database, schedule) for schedule in schedules]
+    expected = [describe_cron_line(schedule_id, line) for schedule_id, line in entries]
+
+    installed = await list_backup_cron(
+        instance_id=database.db_instance_id,
+        database_id=database.id,
+        ssh_password=database.instance_root_password,
+    )
+    # Whole lines are compared, so a changed codec, level, script path or
+    # rotated password is repaired too
+    in_sync = installed["legacy_entries"] == 0 and sorted(
+        installed["lines"], key=lambda entry: (str(entry[0]), entry[1])
+    ) == sorted(entries)
+
+    if not in_sync and repair:
+        await set_backup_cron(
+            instance_id=database.db_instance_id,
+            database_id=database.id,
+            ssh_password=database.instance_root_password,
+            entries=entries,
+        )
+
+    expected_ids = {entry["schedule_id"] for entry in expected}
+    installed_ids = [entry["schedule_id"] for entry in installed["entries"]]
+    return {
+        "database_id": database.id,
+        "in_sync": in_sync,
+        "repaired": not in_sync and repair,
+        "expected": expected,
+        "installed": installed["entries"],
+        "missing": sorted(expected_ids - set(installed_ids)),
+        "unexpected": [
+            schedule_id
+            for schedule_id in installed_ids
+            if schedule_id not in expected_ids
+        ],
+        "duplicates": sorted(
+            {
+                schedule_id
+                for schedule_id in installed_ids
+                if installed_ids.count(schedule_id) > 1
+            }
+        ),
+        "legacy_entries": installed["legacy_entries"],
+    }
+
+
+async def reconcile_all_backup_cron(repair: bool = True) -> List[dict]:
+    """
+    Reconcile every database, a few instances at a time.
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(select(Database))
+        databases = result.scalars().all()
+
+    semaphore = asyncio.Semaphore(settings.backup_cron_reconcile_concurrency)
+
+    async def reconcile(database):
+        async with semaphore:
+            try:
+                async with async_session_maker() as session:
+                    return await reconcile_backup_cron(session, database, repair)
+            except Exception as e:
+                return {"database_id": database.id, "error": str(e)}
+
+    return await asyncio.gather(*(reconcile(database) for database in databases))
@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import re
+from datetime import datetime, date, time, timedelta
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.future import select
+from app.config import settings
+from app.constants.enums import BackupStatus
+from app.models import Database, BackupRun, BackupSchedule, BackupSyncState
+from app.utils.db import async_session_maker
+from app.utils.pagination import encode_keyset_cursor, keyset_after
+from app.utils.executors import iterate_blocking, OBJECT_STORAGE_POOL
+from app.utils.linode import (
+    BACKUP_TIMESTAMP_FORMAT,
+    get_backup_log_folder,
+    parse_backup_summary,
+)
+from app.utils.async_linode import iter_backup_log_pages, get_backup_log
+
+# <YYYY-MM-DD_HH-MM-SS> - <message>
+_LOG_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}) - (.*)$")
+
+
+def backup_run_id(log_key: str) -> str:
+    return hashlib.sha256(log_key.encode("utf-8")).hexdigest()
+
+
+def get_log_timestamp(key: str) -> Optional[datetime]:
+    # <folder>/YYYY/MM/<YYYY-MM-DD_HH-MM-SS>_backup.log
+    name = key.rsplit("/", 1)[-1]
+    try:
+        return datetime.strptime(name[:19], BACKUP_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def parse_backup_log(database_id: str, log_key: str, content: str) -> dict:
+    """
+    A backup_runs row from a run log. Logs written before the script printed
+    a BACKUP_SUMMARY line are judged by their messages and timestamps.
+    """
+    lines = []
+    for line in content.splitlines():
+        match = _LOG_LINE.match(line.strip())
+        if match:
+            timestamp = datetime.strptime(match.group(1), BACKUP_TIMESTAMP_FORMAT)
+            lines.append((timestamp, match.group(2)))
+
+    started_at = get_log_timestamp(log_key) or (lines[0][0] if lines else None)
+    failures = [message for _, message in lines if "fail" in message.lower()]
+    summary = parse_backup_summary(content)
+
+    if summary is not None:
+        succeeded = summary.get("status") == "completed"
+        duration = summary["duration"]
+    else:
+        succeeded = not failures and any(
+            "successfully uploaded" in message for _, message in lines
+        )
+        duration = (lines[-1][0] - lines[0][0]).total_seconds() if lines else None
+        summary = {}
+
+    finished_at = None
+    if started_at is not None and duration is not None:
+        finished_at = started_at + timedelta(seconds=duration)
+
+    return {
+        # Logs of scheduler runs carry the id of their row
+        "id": summary.get("run_id") or backup_run_id(log_key),
+        "database_id": database_id,
+        "status": BackupStatus.COMPLETED if succeeded else BackupStatus.FAILED,
+        "started_at": started_at or datetime.utcnow(),
+        "finished_at": finished_at,
+        "duration_seconds": duration,
+        "bytes": summary.get("bytes") if succeeded else None,
+        "upload_seconds": summary.get("upload_seconds"),
+        "codec": summary.get("codec"),
+        "mode": summary.get("mode"),
+        "key": summary.get("key") or None,
+        "log_key": log_key,
+        "error": None if succeeded else (failures[-1] if failures else None),
+    }
+
+
+async def _store_backup_runs(session, database_id: str, rows: List[dict]):
+    # Runs started by the scheduler are already recorded. Logs with a run id
+    # update their row through the primary key, older ones are matched by key
+    keys = [row["key"] for row in rows if row["key"]]
+    recorded = {}
+    if keys:
+        result = await session.execute(
+            select(BackupRun).where(
+                BackupRun.database_id == database_id,
+                BackupRun.log_key.is_(None),
+                BackupRun.key.in_(keys),
+            )
+        )
+        recorded = {run.key: run for run in result.scalars().all()}
+
+    new_rows = []
+    for row in rows:
+        run = recorded.get(row["key"])
+        if run is None:
+            new_rows.append(row)
+            continue
+        run.log_key = row["log_key"]
+        run.upload_seconds = row["upload_seconds"]
+        run.codec = row["codec"]
+        run.mode = row["mode"]
+
+    if new_rows:
+        statement = insert(BackupRun).values(new_rows)
+        await session.execute(
+            statement.on_duplicate_key_update(
+                status=statement.inserted.status,
+                finished_at=statement.inserted.finished_at,
+                duration_seconds=statement.inserted.duration_seconds,
+                bytes=statement.inserted.bytes,
+                upload_seconds=statement.inserted.upload_seconds,
+                codec=statement.inserted.codec,
+                mode=statement.inserted.mode,
+                key=statement.inserted.key,
+                log_key=statement.inserted.log_key,
+                error=statement.inserted.error,
+            )
+        )
+
+
+async def ingest_backup_logs(session, database: Database, full: bool = False) -> dict:
+    """
+    Record the runs of a database from the logs uploaded since the last
+    ingestion. Log keys sort by time, so only the keys after the watermark
+    are listed, and each page's logs are fetched concurrently in batches.
+    """
+    prefix = get_backup_log_folder(database.user_id, database.db_type, database.id)
+    state = await session.get(BackupSyncState, prefix)
+    if state is None:
+        state = BackupSyncState(prefix=prefix, database_id=database.id)
+        session.add(state)
+
+    started_at = datetime.utcnow()
+    pages = iter_backup_log_pages(
+        user_id=database.user_id,
+        database_type=database.db_type,
+        db_id=database.id,
+        start_after=None if full else state.watermark,
+        page_size=settings.backup_log_batch_size,
+    )
+
+    ingested = 0
+    latest = None
+    async for page in iterate_blocking(OBJECT_STORAGE_POOL, pages):
+        contents = await asyncio.gather(*(get_backup_log(log["id"]) for log in page))
+        rows = [
+            parse_backup_log(database.id, log["id"], content)
+            for log, content in zip(page, contents)
+        ]
+        await _store_backup_runs(session, database.id, rows)
+        ingested += len(rows)
+        latest = max(
+            rows + ([latest] if latest else []), key=lambda row: row["started_at"]
+        )
+        # Commit batch by batch so an interrupted ingestion keeps its progress
+        state.watermark = page[-1]["id"]
+        await session.commit()
+
+    # Schedules show the outcome of the database's last run, unless the
+    # control plane scheduler is running one right now
+    if latest is not None:
+        await session.execute(
+            update(BackupSchedule)
+            .where(
+                BackupSchedule.database_id == database.id,
+                BackupSchedule.status != BackupStatus.RUNNING,
+            )
+            .values(status=latest["status"])
+        )
+
+    state.synced_at = started_at
+    await session.commit()
+    return {"ingested": ingested, "watermark": state.watermark}
+
+
+def describe_backup_run(run: BackupRun) -> dict:
+    return {
+        "id": run.id,
+        "database_id": run.database_id,
+        "schedule_id": run.schedule_id,
+        "status": run.status.value,
+        "scheduled_for": run.scheduled_for,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "duration_seconds": run.duration_seconds,
+        "bytes": run.bytes,
+        "upload_seconds": run.upload_seconds,
+        "throughput_mb_s": _throughput(run.bytes, run.duration_seconds),
+        "codec": run.codec,
+        "mode": run.mode,
+        "key": run.key,
+        "error": run.error,
+    }
+
+
+def _throughput(size: Optional[int], seconds: Optional[float]) -> Optional[float]:
+    # Compressed megabytes written per second of the whole run
+    if not size or not seconds:
+        return None
+    return round(size / seconds / 1048576, 3)
+
+
+def _run_filters(
+    database_id: str,
+    status: Optional[BackupStatus] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+) -> list:
+    filters = [BackupRun.database_id == database_id]
+    if status is not None:
+        filters.append(BackupRun.status == status)
+    if from_date:
+        filters.append(BackupRun.started_at >= datetime.combine(from_date, time.min))
+    if to_date:
+        filters.append(BackupRun.started_at <= datetime.combine(to_date, time.max))
+    return filters
+
+
+async def list_backup_runs(
+    session, database_id: str, limit: int = 100, cursor: str = None, **filters
+) -> dict:
+    """
+    Keyset-paginated listing on (started_at, id), served by the
+    (database_id, started_at) index.
+    """
+    conditions = _run_filters(database_id, **filters)
+    if cursor:
+        conditions.append(keyset_after(BackupRun.started_at, BackupRun.id, cursor))
+
+    result = await session.execute(
+        select(BackupRun)
+        .where(*conditions)
+        .order_by(BackupRun.started_at, BackupRun.id)
+        .limit(limit + 1)
+    )
+    runs = result.scalars().all()
+
+    next_cursor = None
+    if len(runs) > limit:
+        runs = runs[:limit]
+        last = runs[-1]
+        next_cursor = encode_keyset_cursor(last.started_at, last.id)
+
+    return {
+        "backup_runs": [describe_backup_run(run) for run in runs],
+        "next_cursor": next_cursor,
+    }
+
+
+def _slope(days: np.ndarray, values: np.ndarray) -> Optional[float]:
+    # Least squares change per day, needs runs on two different days
+    if len(values) < 2 or np.ptp(days) == 0:
+        return None
+    return float(np.polyfit(days, values, 1)[0])
+
+
+async def get_backup_run_trends(session, database_id: str, days: int = 30) -> dict:
+    """
+    Daily averages of the runs of the last `days` days, and the fitted change
+    per day of the duration and throughput of the successful ones. A negative
+    throughput trend flags backups getting slower.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    result = await session.execute(
+        select(
+            BackupRun.started_at,
+            BackupRun.status,
+            BackupRun.duration_seconds,
+            BackupRun.bytes,
+        )
+        .where(BackupRun.database_id == database_id, BackupRun.started_at >= since)
+        .order_by(BackupRun.started_at)
+    )
+    runs = result.all()
+
+    daily = {}
+    offsets, durations, throughputs = [], [], []
+    for started_at, status, duration, size in runs:
+        day = daily.setdefault(
+            started_at.date(),
+            {"runs": 0, "failed": 0, "durations": [], "bytes": [], "throughputs": []},
+        )
+        day["runs"] += 1
+        if status != BackupStatus.COMPLETED:
+            day["failed"] += 1
+            continue
+        throughput = _throughput(size, duration)
+        if throughput is None:
+            continue
+        day["durations"].append(duration)
+        day["bytes"].append(size)
+        day["throughputs"].append(throughput)
+        offsets.append((started_at - since).total_seconds() / 86400)
+        durations.append(duration)
+        throughputs.append(throughput)
+
+    def mean(values: list) -> Optional[float]:
+        return round(float(np.mean(values)), 3) if values else None
+
+    offsets = np.array(offsets)
+    throughput_trend = _slope(offsets, np.array(throughputs))
+    mean_throughput = mean(throughputs)
+    return {
+        "database_id": database_id,
+        "days": days,
+        "runs": len(runs),
+        "failed": sum(day["failed"] for day in daily.values()),
+        "daily": [
+            {
+                "date": day_date,
+                "runs": day["runs"],
+                "failed": day["failed"],
+                "avg_duration_seconds": mean(day["durations"]),
+                "avg_bytes": mean(day["bytes"]),
+                "avg_throughput_mb_s": mean(day["throughputs"]),
+            }
+            for day_date, day in sorted(daily.items())
+        ],
+        "avg_throughput_mb_s": mean_throughput,
+        "duration_trend_seconds_per_day": _slope(offsets, np.array(durations)),
+        "throughput_trend_mb_s_per_day": throughput_trend,
+        # Fitted change over the window relative to the average throughput
+        "throughput_change": (
+            round(throughput_trend * days / mean_throughput, 3)
+            if throughput_trend is not None and mean_throughput
+            else None
+        ),
+    }
+
+
+async def ingest_all_backup_logs():
+    async with async_session_maker() as session:
+        result = await session.execute(select(Database))
+        databases = result.scalars().all()
+
+    semaphore = asyncio.Semaphore(settings.backup_log_ingest_concurrency)
+
+    async def ingest(database: Database):
+        async with semaphore:
+            async with async_session_maker() as session:
+                try:
+                    await ingest_backup_logs(session, database)
+                except Exception as e:
+                    print(f"Error ingesting backup logs of {database.id}: {e}")
+
+    await asyncio.gather(*(ingest(database) for database in databases))
+
+
+async def run_backup_log_ingestion():
+    while True:
+        try:
+            await ingest_all_backup_logs()
+        except Exception as e:
+            print(f"Error ingesting backup logs: {e}")
+        await asyncio.sleep(settings.backup_log_ingest_interval)
@@ -0,0 +1,282 @@
+import asyncio
+import calendar
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from uuid import uuid4
+from sqlalchemy import exists, or_, update
+from sqlalchemy.future import select
+from app.config import settings
+from app.constants.enums import (
+    BackupCodec,
+    BackupSchedule as BackupFrequency,
+    BackupStatus,
+)
+from app.models import Database, BackupSchedule, BackupRun
+from app.utils.db import async_session_maker
+from app.utils.async_linode import run_backup_script
+
+
+def previous_fire_time(schedule: BackupSchedule, now: datetime) -> Optional[datetime]:
+    """
+    The latest time at or before `now` the schedule should have started, the
+    way cron would have fired it (UTC, day_of_week 0 is Sunday).
+    """
+    time_of_day = {
+        "hour": schedule.hour_of_day,
+        "minute": schedule.minute_offset or 0,
+        "second": schedule.second_offset or 0,
+        "microsecond": 0,
+    }
+    frequency = BackupFrequency(schedule.frequency)
+
+    if frequency == BackupFrequency.daily:
+        fire = now.replace(**time_of_day)
+        if fire > now:
+            fire -= timedelta(days=1)
+        return fire
+
+    if frequency == BackupFrequency.weekly:
+        days_back = (now.isoweekday() % 7 - schedule.day_of_week) % 7
+        fire = (now - timedelta(days=days_back)).replace(**time_of_day)
+        if fire > now:
+            fire -= timedelta(days=7)
+        return fire
+
+    # Monthly, months without the day are skipped like cron does
+    year, month = now.year, now.month
+    for _ in range(13):
+        if schedule.day_of_month <= calendar.monthrange(year, month)[1]:
+            fire = datetime(year, month, schedule.day_of_month, **time_of_day)
+            if fire <= now:
+                return fire
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return None
+
+
+class BackupScheduler:
+    """
+    Control plane replacement for the per-instance crontab: runs due
+    schedules over SSH connections and threads of their own, at most
+    `concurrency` at once and `region_concurrency` per region, and records
+    every run. Runs missed while the service was down are started late, up
+    to `catchup` ago.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        region_concurrency: int,
+        interval: float,
+        catchup: timedelta,
+    ):
+        self.region_concurrency = region_concurrency
+        self.interval = interval
+        self.catchup = catchup
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._regions: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _region_semaphore(self, region: str) -> asyncio.Semaphore:
+        if region not in self._regions:
+            self._regions[region] = asyncio.Semaphore(self.region_concurrency)
+        return self._regions[region]
+
+    async def recover(self):
+        """
+        Fail the runs cut short by the restart of a replica. Other replicas
+        may be running backups right now, so only runs older than
+        backup_run_timeout are taken for dead, and only the schedules left
+        without a running run.
+        """
+        stale_before = datetime.utcnow() - timedelta(
+            seconds=settings.backup_run_timeout
+        )
+        async with async_session_maker() as session:
+            await session.execute(
+                update(BackupRun)
+                .where(
+                    BackupRun.status == BackupStatus.RUNNING,
+                    BackupRun.started_at < stale_before,
+                    # The ones this process is still running aren't dead
+                    BackupRun.schedule_id.not_in(list(self._tasks)),
+                )
+                .values(
+                    status=BackupStatus.FAILED,
+                    finished_at=datetime.utcnow(),
+                    error="No outcome within backup_run_timeout, its scheduler was restarted",
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.execute(
+                update(BackupSchedule)
+                .where(
+                    BackupSchedule.status == BackupStatus.RUNNING,
+                    ~exists().where(
+                        BackupRun.schedule_id == BackupSchedule.id,
+                        BackupRun.status == BackupStatus.RUNNING,
+                    ),
+                )
+                .values(status=BackupStatus.FAILED)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def tick(self, now: datetime = None):
+        now = now or datetime.utcnow()
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(BackupSchedule, Database.region).join(
+                    Database, Database.id == BackupSchedule.database_id
+                )
+            )
+            for schedule, region in result.all():
+                if schedule.id in self._tasks:
+                    continue
+                fire = previous_fire_time(schedule, now)
+                if fire is None or (schedule.created_at and fire < schedule.created_at):
+                    continue
+                if schedule.last_run_at is not None and schedule.last_run_at >= fire:
+                    continue
+                if now - fire > self.catchup:
+                    self.skipped += 1
+                    continue
+
+                # Claimed before it runs, so neither a restart nor another
+                # replica starts it twice
+                claimed = await session.execute(
+                    update(BackupSchedule)
+                    .where(
+                        BackupSchedule.id == schedule.id,
+                        or_(
+                            BackupSchedule.last_run_at.is_(None),
+                            BackupSchedule.last_run_at < fire,
+                        ),
+                    )
+                    .values(last_run_at=fire)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                if claimed.rowcount != 1:
+                    continue
+                self._tasks[schedule.id] = asyncio.create_task(
+                    self._run(schedule.id, region, fire)
+                )
+
+    async def _run(self, schedule_id: str, region: str, fire: datetime):
+        waiting = True
+        self.waiting += 1
+        try:
+            async with self._semaphore, self._region_semaphore(region):
+                waiting = False
+                self.waiting -= 1
+                await self._execute(schedule_id, fire)
+        except Exception as e:
+            print(f"Error running backup schedule {schedule_id}: {e}")
+        finally:
+            # Also when cancelled while waiting for the semaphores
+            if waiting:
+                self.waiting -= 1
+            self._tasks.pop(schedule_id, None)
+
+    async def _execute(self, schedule_id: str, fire: datetime):
+        async with async_session_maker() as session:
+            schedule = await session.get(BackupSchedule, schedule_id)
+            if schedule is None:
+                return
+            database = await session.get(Database, schedule.database_id)
+
+            run = BackupRun(
+                id=str(uuid4()),
+                database_id=database.id,
+                schedule_id=schedule.id,
+                status=BackupStatus.RUNNING,
+                scheduled_for=fire,
+                started_at=datetime.utcnow(),
+            )
+            schedule.status = BackupStatus.RUNNING
+            session.add(run)
+            await session.commit()
+
+            started = time.monotonic()
+            summary = {}
+            try:
+                result = await run_backup_script(
+                    database_id=database.id,
+                    user_id=database.user_id,
+                    instance_id=database.db_instance_id,
+                    db_type=database.db_type,
+                    ssh_password=database.instance_root_password,
+                    db_password=database.db_root_password,
+                    codec=BackupCodec(schedule.codec).value,
+                    compression_level=schedule.compression_level,
+                    compression_threads=schedule.compression_threads,
+                    retention_days=schedule.retention_days,
+                    run_id=run.id,
+                )
+                summary = result["summary"] or {}
+                succeeded = summary.get("status") == "completed"
+                if not succeeded:
+                    run.error = (
+                        "The backup script reported a failure"
+                        if summary
+                        else f"The backup script exited with {result['exit_status']} without a summary"
+                    )
+            except Exception as e:
+                succeeded = False
+                run.error = str(e)
+
+            run.finished_at = datetime.utcnow()
+            run.duration_seconds = summary.get("duration") or (
+                time.monotonic() - started
+            )
+            run.bytes = summary.get("bytes")
+            run.upload_seconds = summary.get("upload_seconds")
+            run.codec = summary.get("codec")
+            run.mode = summary.get("mode")
+            run.key = summary.get("key")
+            run.status = BackupStatus.COMPLETED if succeeded else BackupStatus.FAILED
+            schedule.status = run.status
+            await session.commit()
+
+        if succeeded:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    async def run(self):
+        while True:
+            try:
+                # Also picks up the runs of replicas that never came back
+                await self.recover()
+                await self.tick()
+            except Exception as e:
+                print(f"Error checking backup schedules: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.backup_scheduler_enabled,
+            "running": len(self._tasks) - self.waiting,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
+
+
+backup_scheduler = BackupScheduler(
+    concurrency=settings.backup_scheduler_concurrency,
+    region_concurrency=settings.backup_scheduler_region_concurrency,
+    interval=settings.backup_scheduler_interval,
+    catchup=timedelta(hours=settings.backup_scheduler_catchup_hours),
+)
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Optional
+
+
+class _RequestScope:
+    # Objects loaded while serving the current request, keyed by (kind, id)
+    def __init__(self):
+        self.objects = {}
+        self.locks = {}
+
+
+_request_scope: ContextVar[Optional[_RequestScope]] = ContextVar(
+    "request_scope", default=None
+)
+
+
+@contextmanager
+def request_cache_scope():
+    """
+    Memoize upstream loads for the duration of a request. Worker threads see
+    the same scope because the executors copy the caller's context.
+    """
+    token = _request_scope.set(_RequestScope())
+    try:
+        yield
+    finally:
+        _request_scope.reset(token)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache of per-object entries where every field carries its
+    own freshness. Entries are keyed by (kind, id) and fields are looked up
+    with the TTL the caller considers fresh enough for that field.
+    """
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.request_hits = 0
+        self.request_misses = 0
+
+    def get(self, key: Hashable, field: str, ttl: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and field in entry:
+                value, stored_at = entry[field]
+                if time.monotonic() - stored_at < ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, field: str, value: Any):
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            entry[field] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(
+        self, key: Hashable, field: str, ttl: float, loader: Callable[[], Any]
+    ):
+        found, value = self.get(key, field, ttl)
+        if found:
+            return value
+        value = loader()
+        self.set(key, field, value)
+        return value
+
+    def load_for_request(self, key: Hashable, loader: Callable[[], Any]):
+        """
+        Return the object already loaded in this request, loading it at most
+        once even when several parts of the request ask for it concurrently.
+        Outside of a request scope this simply calls the loader.
+        """
+        scope = _request_scope.get()
+        if scope is None:
+            return loader()
+        if key in scope.objects:
+            self.request_hits += 1
+            return scope.objects[key]
+        with scope.locks.setdefault(key, threading.Lock()):
+            if key in scope.objects:
+                self.request_hits += 1
+                return scope.objects[key]
+            self.request_misses += 1
+            obj = loader()
+            scope.objects[key] = obj
+            return obj
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+        scope = _request_scope.get()
+        if scope is not None:
+            scope.objects.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "request_hits": self.request_hits,
+                "request_misses": self.request_misses,
+            }
@@ -0,0 +1,107 @@
+import re
+from typing import Dict, List, Tuple
+from app.constants.contants import (
+    BACKUP_CRON_BLOCK_BEGIN,
+    BACKUP_CRON_BLOCK_END,
+    BACKUP_CRON_SCHEDULE_TAG,
+    BACKUP_SCRIPT_SAVE_PATH,
+)
+
+_BLOCK_BEGIN = re.compile(r"^" + re.escape(BACKUP_CRON_BLOCK_BEGIN) + r" (\S+)$")
+_BLOCK_END = re.compile(r"^" + re.escape(BACKUP_CRON_BLOCK_END) + r" (\S+)$")
+_START_DELAY = re.compile(r"^sleep (\d+); ")
+
+
+def backup_cron_line(
+    cron_schedule: str, start_delay_seconds: int, backup_command: str
+) -> str:
+    return f"{cron_schedule} sleep {int(start_delay_seconds or 0)}; {backup_command}"
+
+
+def _is_legacy_entry(line: str, database_id: str) -> bool:
+    # Untagged lines appended before the entries were kept in blocks
+    stripped = line.strip()
+    return (
+        not stripped.startswith("#")
+        and BACKUP_SCRIPT_SAVE_PATH in stripped
+        and database_id in stripped.split()
+    )
+
+
+def describe_cron_line(schedule_id: str, line: str) -> dict:
+    fields = line.split(None, 5)
+    command = fields[5] if len(fields) > 5 else ""
+    delay = _START_DELAY.match(command)
+    return {
+        "schedule_id": schedule_id,
+        "cron": " ".join(fields[:5]),
+        "start_delay_seconds": int(delay.group(1)) if delay else 0,
+    }
+
+
+def read_backup_blocks(crontab: str) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    The (schedule_id, cron line) entries of every database block of a
+    crontab. The lines carry the database password, keep them internal.
+    """
+    blocks: Dict[str, List[Tuple[str, str]]] = {}
+    database_id = schedule_id = None
+    for line in crontab.splitlines():
+        line = line.strip()
+        begin, end = _BLOCK_BEGIN.match(line), _BLOCK_END.match(line)
+        if begin:
+            database_id, schedule_id = begin.group(1), None
+            blocks.setdefault(database_id, [])
+        elif end:
+            database_id = None
+        elif database_id is None or not line:
+            continue
+        elif line.startswith(BACKUP_CRON_SCHEDULE_TAG):
+            schedule_id = line[len(BACKUP_CRON_SCHEDULE_TAG) :].strip()
+        elif not line.startswith("#"):
+            blocks[database_id].append((schedule_id, line))
+            schedule_id = None
+    return blocks
+
+
+def count_legacy_entries(crontab: str, database_id: str) -> int:
+    inside = False
+    count = 0
+    for line in crontab.splitlines():
+        if _BLOCK_BEGIN.match(line.strip()):
+            inside = True
+        elif _BLOCK_END.match(line.strip()):
+            inside = False
+        elif not inside and _is_legacy_entry(line, database_id):
+            count += 1
+    return count
+
+
+def replace_backup_block(
+    crontab: str, database_id: str, entries: List[Tuple[str, str]]
+) -> str:
+    """
+    Replace the block of a database with one tagged line per
+    (schedule_id, cron line) entry. Every previous block of the database and
+    its legacy untagged lines are dropped, and no entries removes the block.
+    """
+    kept = []
+    skipping = False
+    for line in crontab.splitlines():
+        begin, end = _BLOCK_BEGIN.match(line.strip()), _BLOCK_END.match(line.strip())
+        if begin and begin.group(1) == database_id:
+            skipping = True
+        elif skipping:
+            if end and end.group(1) == database_id:
+                skipping = False
+        elif not _is_legacy_entry(line, database_id):
+            kept.append(line)
+
+    if entries:
+        kept.append(f"{BACKUP_CRON_BLOCK_BEGIN} {database_id}")
+        for schedule_id, line in entries:
+            kept.append(f"{BACKUP_CRON_SCHEDULE_TAG}{schedule_id}")
+            kept.append(line)
+        kept.append(f"{BACKUP_CRON_BLOCK_END} {database_id}")
+
+    return "\n".join(kept) + "\n" if kept else ""
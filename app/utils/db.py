@@ -1,22 +1,142 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker
-from typing import AsyncGenerator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from typing import AsyncGenerator, Iterable, List, Optional
 from datetime import time
+import asyncio
+import threading
+import time as timer
+import aiomysql
 from app.constants.enums import BackupSchedule, DatabaseType
 from app.config import settings
-import pymysql
 from app.constants.contants import INSTANCE_DEFAULT_USER
+from app.utils.cache import TTLCache
+from app.utils.executors import run_blocking, LINODE_API_POOL
 from app.utils.linode import get_server_ip
+from app.utils.metrics import (
+    db_session_duration,
+    db_session_errors,
+    db_sessions_in_flight,
+)
 
 DATABASE_URL = f"mysql+aiomysql://{settings.db_user}:{settings.db_password}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+class PoolStats:
+    """
+    How long connection checkouts waited and how many timed out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "avg_checkout_wait_seconds": (
+                    self.total_wait / self.checkouts if self.checkouts else 0.0
+                ),
+                "max_checkout_wait_seconds": self.max_wait,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    # Times every checkout, including the wait for a free connection
+    def _do_get(self):
+        started = timer.monotonic()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record(timer.monotonic() - started, timed_out=True)
+            raise
+        pool_stats.record(timer.monotonic() - started)
+        return connection
+
+
+def create_db_engine() -> AsyncEngine:
+    return create_async_engine(
+        DATABASE_URL,
+        echo=settings.db_echo,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args={"connect_timeout": settings.db_connect_timeout},
+    )
+
+
+# Bound to the shared engine by init_engine()
+engine: Optional[AsyncEngine] = None
+async_session_maker = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+def init_engine() -> AsyncEngine:
+    global engine
+    if engine is None:
+        engine = create_db_engine()
+        async_session_maker.configure(bind=engine)
+    return engine
+
+
+async def dispose_engine():
+    global engine
+    if engine is not None:
+        await engine.dispose()
+        engine = None
+
+
+def get_pool_stats() -> dict:
+    stats = pool_stats.snapshot()
+    if engine is not None:
+        pool = engine.pool
+        capacity = pool.size() + settings.db_max_overflow
+        stats.update(
+            {
+                "size": pool.size(),
+                "max_overflow": settings.db_max_overflow,
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "utilization": pool.checkedout() / capacity if capacity else 0.0,
+            }
+        )
+    return stats
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
-        yield session
+    db_sessions_in_flight.inc()
+    started = timer.perf_counter()
+    try:
+        async with async_session_maker() as session:
+            yield session
+    except SQLAlchemyError:
+        # Only database failures, not the HTTPExceptions raised by endpoints
+        db_session_errors.inc()
+        raise
+    finally:
+        db_session_duration.observe(timer.perf_counter() - started)
+        db_sessions_in_flight.dec()
 
 
 def validate_backup_schedule_inputs(
@@ -60,14 +180,16 @@ def validate_backup_schedule_inputs(
 
 
 def convert_schedule_to_cron(
-    hour_of_day: int, day_of_week: int, day_of_month: int, frequency: BackupSchedule
+    hour_of_day: int,
+    day_of_week: int,
+    day_of_month: int,
+    frequency: BackupSchedule,
+    minute: int = 0,
 ) -> str:
     """
     Converts validated backup schedule parameters into a cron expression.
     """
 
-    minute = "0"  # NOTE: Assuming backups are scheduled at the beginning of the hour
-
     if frequency == BackupSchedule.daily.value:
         # Runs every day at the specified hour
         cron_expression = f"{minute} {hour_of_day} * * *"
@@ -86,33 +208,90 @@ def convert_schedule_to_cron(
     return cron_expression
 
 
-def check_connection_to_database(
+probe_cache = TTLCache("db_probe", settings.db_probe_cache_max_entries)
+
+
+async def check_connection_to_database(
     db_type: DatabaseType,
     instance_id: str,
     password: str,
     user: str = INSTANCE_DEFAULT_USER,
-):
+) -> dict:
     """
-    Check if the application can connect to the database
+    Check if the application can connect to the database, and how long the
+    connection and a SELECT 1 round trip take
     """
+    if db_type != DatabaseType.mysql.value:
+        raise ValueError("Unsupported database type", db_type)
 
     # Get the database instance details
-    server_ip = get_server_ip(instance_id)
+    server_ip = await run_blocking(LINODE_API_POOL, get_server_ip, instance_id)
 
-    if db_type == DatabaseType.mysql.value:
-        try:
-
-            connection = pymysql.connect(
+    started = timer.perf_counter()
+    try:
+        connection = await asyncio.wait_for(
+            aiomysql.connect(
                 host=server_ip,
                 port=3306,
                 user=user,
                 password=password,
-                connect_timeout=30,
+                connect_timeout=settings.db_probe_connect_timeout,
+            ),
+            timeout=settings.db_probe_connect_timeout,
+        )
+    except Exception as e:
+        return {"status": False, "stage": "connect", "error": str(e) or repr(e)}
+
+    connect_seconds = timer.perf_counter() - started
+    try:
+        query_started = timer.perf_counter()
+        async with connection.cursor() as cursor:
+            await asyncio.wait_for(
+                cursor.execute("SELECT 1"), timeout=settings.db_probe_query_timeout
             )
-            connection.close()
-            return True
-        except Exception as e:
-            print(f"Error connecting to the database: {str(e)}")
-            return False
-    else:
-        raise ValueError("Unsupported database type", db_type)
+            await cursor.fetchone()
+        query_seconds = timer.perf_counter() - query_started
+    except Exception as e:
+        return {"status": False, "stage": "query", "error": str(e) or repr(e)}
+    finally:
+        connection.close()
+
+    return {
+        "status": True,
+        "connect_ms": round(connect_seconds * 1000, 2),
+        "latency_ms": round(query_seconds * 1000, 2),
+    }
+
+
+async def probe_database(database, use_cache: bool = True) -> dict:
+    """
+    Cached connectivity check of a Database row (or a row with the same
+    columns), so repeated health checks don't reconnect every time.
+    """
+    key = ("database", database.id)
+    if use_cache:
+        hit, probe = probe_cache.get(key, "connection", settings.db_probe_cache_ttl)
+        if hit:
+            return probe
+
+    try:
+        probe = await check_connection_to_database(
+            db_type=database.db_type,
+            instance_id=database.db_instance_id,
+            password=database.db_root_password,
+        )
+    except Exception as e:
+        probe = {"status": False, "stage": "lookup", "error": str(e)}
+    probe["checked_at"] = timer.time()
+    probe_cache.set(key, "connection", probe)
+    return probe
+
+
+async def probe_databases(databases: Iterable, use_cache: bool = True) -> List[dict]:
+    semaphore = asyncio.Semaphore(settings.db_probe_concurrency)
+
+    async def probe(database):
+        async with semaphore:
+            return await probe_database(database, use_cache=use_cache)
+
+    return await asyncio.gather(*(probe(database) for database in databases))
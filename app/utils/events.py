@@ -0,0 +1,158 @@
+import asyncio
+from typing import Dict, Optional, Set
+from app.config import settings
+from app.utils.async_linode import get_instance_status
+from app.utils.stats_store import stats_store, refresh_instance_stats
+
+
+class Subscription:
+    """
+    A connected client and the instances it watches, mapped to the database
+    id the events are reported under.
+    """
+
+    def __init__(self, targets: Dict[str, str], max_events: int):
+        self.targets = targets
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_events)
+        self.dropped = 0
+
+    def push(self, event: dict):
+        # A slow client loses its oldest events rather than stalling the watcher
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class StatusWatcher:
+    """
+    Single background poller of the status and latest stats of the watched
+    instances, pushing only what changed to the subscribers. Upstream calls
+    scale with the watched instances, not with the connected clients.
+    """
+
+    def __init__(self, interval: float, max_events: int):
+        self.interval = interval
+        self.max_events = max_events
+        self._subscriptions: Set[Subscription] = set()
+        self._snapshots: Dict[str, dict] = {}
+        self._wake = asyncio.Event()
+        self.polls = 0
+        self.events = 0
+
+    def subscribe(self, targets: Dict[str, str]) -> Subscription:
+        subscription = Subscription(targets, self.max_events)
+        self._subscriptions.add(subscription)
+        # Start the client from the last known state, then send deltas
+        for instance_id, database_id in targets.items():
+            snapshot = self._snapshots.get(instance_id)
+            if snapshot is not None:
+                subscription.push(
+                    self._event("snapshot", instance_id, database_id, snapshot)
+                )
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def watched(self) -> Set[str]:
+        return {
+            instance_id
+            for subscription in self._subscriptions
+            for instance_id in subscription.targets
+        }
+
+    @staticmethod
+    def _event(kind: str, instance_id: str, database_id: str, fields: dict) -> dict:
+        return {
+            "type": kind,
+            "database_id": database_id,
+            "instance_id": instance_id,
+            **fields,
+        }
+
+    async def _snapshot(self, instance_id: str) -> Optional[dict]:
+        try:
+            status, stats = await asyncio.gather(
+                get_instance_status(instance_id), refresh_instance_stats(instance_id)
+            )
+        except Exception as e:
+            return {"error": str(e)}
+        return {
+            "status": status,
+            "stats_status": stats["status"],
+            "stats": stats_store.latest(instance_id),
+        }
+
+    @staticmethod
+    def _delta(previous: Optional[dict], current: dict) -> dict:
+        if previous is None:
+            return current
+        delta = {}
+        for field, value in current.items():
+            if field == "stats":
+                changed = {
+                    metric: point
+                    for metric, point in value.items()
+                    if previous.get("stats", {}).get(metric) != point
+                }
+                if changed:
+                    delta["stats"] = changed
+            elif previous.get(field) != value:
+                delta[field] = value
+        return delta
+
+    async def poll(self):
+        watched = list(self.watched())
+        snapshots = await asyncio.gather(*(self._snapshot(i) for i in watched))
+        self.polls += 1
+
+        for instance_id, snapshot in zip(watched, snapshots):
+            previous = self._snapshots.get(instance_id)
+            delta = self._delta(previous, snapshot)
+            self._snapshots[instance_id] = snapshot
+            if not delta:
+                continue
+            kind = "snapshot" if previous is None else "update"
+            for subscription in list(self._subscriptions):
+                database_id = subscription.targets.get(instance_id)
+                if database_id is not None:
+                    subscription.push(
+                        self._event(kind, instance_id, database_id, delta)
+                    )
+                    self.events += 1
+
+        # Forget instances nobody watches anymore
+        for instance_id in set(self._snapshots) - set(watched):
+            del self._snapshots[instance_id]
+
+    async def run(self):
+        while True:
+            if not self._subscriptions:
+                self._wake.clear()
+                await self._wake.wait()
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Error polling watched instances: {e}")
+            self._wake.clear()
+            try:
+                # New subscribers get their first snapshot without a full wait
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "watched_instances": len(self.watched()),
+            "polls": self.polls,
+            "events": self.events,
+            "dropped": sum(s.dropped for s in self._subscriptions),
+        }
+
+
+status_watcher = StatusWatcher(
+    settings.events_poll_interval, settings.events_queue_size
+)
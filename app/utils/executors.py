@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Dict, Optional, Tuple
+from app.config import settings
+
+LINODE_API_POOL = "linode_api"
+OBJECT_STORAGE_POOL = "object_storage"
+SSH_POOL = "ssh"
+# Scheduled backups hold their worker for the whole run, up to
+# backup_run_timeout, so they get threads of their own
+BACKUP_RUN_POOL = "backup_run"
+
+# time.monotonic() past which a blocking call is no longer awaited. Set by
+# gather_parts, carried over to the worker thread, and honored by the call
+# itself (e.g. the Linode API adapter) so a timed out part frees its worker.
+call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "call_deadline", default=None
+)
+
+
+class BoundedExecutor:
+    """
+    A named thread pool that keeps track of how many calls are waiting for a
+    worker and how long they waited before starting.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-worker"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._expired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _track(self, submitted_at: float, func, *args, **kwargs):
+        wait = time.monotonic() - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            deadline = call_deadline.get()
+            if deadline is not None and time.monotonic() >= deadline:
+                # Nobody awaits the result anymore, don't start the call
+                with self._lock:
+                    self._expired += 1
+                raise TimeoutError(f"Deadline passed while queued on {self.name}")
+            result = func(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+        return result
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable on this pool and await its result. The caller's
+        context variables are carried over to the worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        with self._lock:
+            self._queued += 1
+        call = functools.partial(
+            context.run, self._track, time.monotonic(), func, *args, **kwargs
+        )
+        future = self._executor.submit(call)
+        # Cancelling the caller cancels a call still in the queue, and _track
+        # never runs for it
+        future.add_done_callback(self._untrack_cancelled)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _untrack_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            started = completed + self._active
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "active": self._active,
+                "completed": completed,
+                "failed": self._failed,
+                "expired": self._expired,
+                "avg_wait_seconds": self._total_wait / started if started else 0.0,
+                "max_wait_seconds": self._max_wait,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+executors = {
+    LINODE_API_POOL: BoundedExecutor(LINODE_API_POOL, settings.linode_api_workers),
+    OBJECT_STORAGE_POOL: BoundedExecutor(
+        OBJECT_STORAGE_POOL, settings.object_storage_workers
+    ),
+    SSH_POOL: BoundedExecutor(SSH_POOL, settings.ssh_workers),
+    BACKUP_RUN_POOL: BoundedExecutor(
+        BACKUP_RUN_POOL, settings.backup_scheduler_concurrency
+    ),
+}
+
+
+async def run_blocking(pool: str, func, *args, **kwargs):
+    return await executors[pool].run(func, *args, **kwargs)
+
+
+def offload(pool: str):
+    """
+    Wrap a blocking function into a coroutine function that runs it on the
+    given pool.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(pool, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def iterate_blocking(pool: str, iterator):
+    """
+    Consume a blocking iterator (e.g. a paginator) from async code, fetching
+    each item on the given pool.
+    """
+    done = object()
+    while True:
+        item = await run_blocking(pool, next, iterator, done)
+        if item is done:
+            break
+        yield item
+
+
+async def gather_parts(
+    parts: Dict[str, Awaitable],
+    timeout: float,
+    timeouts: Optional[Dict[str, float]] = None,
+) -> Tuple[dict, dict]:
+    """
+    Await every part concurrently, each bounded by its own timeout. Returns the
+    results of the parts that succeeded and an error message for the others,
+    so a composite response can degrade instead of failing as a whole.
+
+    Cancelling a part doesn't stop a call already running on a worker thread,
+    so the timeout is also set as the call's deadline: calls still queued at
+    the deadline are dropped, and Linode API requests bound their attempts
+    and retries by it.
+    """
+    timeouts = timeouts or {}
+
+    async def run_part(name: str, awaitable: Awaitable):
+        part_timeout = timeouts.get(name, timeout)
+        # Each part runs in a task of its own, the deadline stays local to it
+        call_deadline.set(time.monotonic() + part_timeout)
+        try:
+            return True, await asyncio.wait_for(awaitable, part_timeout)
+        except asyncio.TimeoutError:
+            return False, f"timed out after {part_timeout}s"
+        except Exception as e:
+            return False, str(e)
+
+    names = list(parts)
+    outcomes = await asyncio.gather(*(run_part(name, parts[name]) for name in names))
+
+    results, errors = {}, {}
+    for name, (ok, value) in zip(names, outcomes):
+        if ok:
+            results[name] = value
+        else:
+            errors[name] = value
+    return results, errors
+
+
+def get_executor_stats() -> dict:
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+def shutdown_executors(wait: bool = True):
+    for executor in executors.values():
+        executor.shutdown(wait=wait)
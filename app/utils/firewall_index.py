@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy.future import select
+from app.config import settings
+from app.constants.contants import FIREWALL_LABEL
+from app.models import Database
+from app.utils.db import async_session_maker
+
+
+class FirewallIndex:
+    """
+    Local index from firewall label and database id to firewall id, so the
+    firewalls of a database or a user are found without listing the account.
+
+    Every process keeps its own index. Rows added or updated anywhere are
+    picked up by the incremental refresh, but a delete is only seen at once by
+    the process that handled it; the others drop the row at their next full
+    refresh, every firewall_index_full_refresh_interval seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_database: Dict[str, dict] = {}
+        self._by_label: Dict[str, str] = {}
+        self._refreshed_at: Optional[datetime] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry(database_id: str, user_id: str, instance_id: str, firewall_id: str):
+        return {
+            "database_id": database_id,
+            "user_id": user_id,
+            "instance_id": str(instance_id),
+            "firewall_id": str(firewall_id),
+            "label": FIREWALL_LABEL.substitute({"INSTANCE_ID": instance_id}),
+        }
+
+    def add(self, database_id: str, user_id: str, instance_id: str, firewall_id: str):
+        entry = self._entry(database_id, user_id, instance_id, firewall_id)
+        with self._lock:
+            self._by_database[database_id] = entry
+            self._by_label[entry["label"]] = entry["firewall_id"]
+
+    def remove_database(self, database_id: str):
+        with self._lock:
+            entry = self._by_database.pop(database_id, None)
+            if entry is not None:
+                self._by_label.pop(entry["label"], None)
+
+    def remove_firewall(self, firewall_id):
+        firewall_id = str(firewall_id)
+        with self._lock:
+            for database_id, entry in list(self._by_database.items()):
+                if entry["firewall_id"] == firewall_id:
+                    del self._by_database[database_id]
+                    self._by_label.pop(entry["label"], None)
+
+    def get_database(self, database_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._by_database.get(database_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get_user(self, user_id: str) -> List[dict]:
+        with self._lock:
+            return [e for e in self._by_database.values() if e["user_id"] == user_id]
+
+    def get_label(self, label: str) -> Optional[str]:
+        with self._lock:
+            return self._by_label.get(label)
+
+    async def refresh(
+        self, session, database_id: Optional[str] = None, full: bool = False
+    ):
+        """
+        Add the rows created or updated since the last refresh (served by the
+        updated_at index), or a single database row when database_id is
+        given. A full refresh rebuilds the index, dropping deleted rows.
+        """
+        query = select(
+            Database.id,
+            Database.user_id,
+            Database.db_instance_id,
+            Database.firewall_id,
+            Database.updated_at,
+        )
+        if database_id is not None:
+            query = query.where(Database.id == database_id)
+        elif self._refreshed_at is not None and not full:
+            query = query.where(Database.updated_at >= self._refreshed_at)
+
+        refreshed_at = datetime.utcnow()
+        result = await session.execute(query)
+        rows = result.all()
+        if full:
+            # Swapped in whole so lookups never see a half built index
+            by_database = {
+                row.id: self._entry(
+                    row.id, row.user_id, row.db_instance_id, row.firewall_id
+                )
+                for row in rows
+            }
+            by_label = {e["label"]: e["firewall_id"] for e in by_database.values()}
+            with self._lock:
+                self._by_database, self._by_label = by_database, by_label
+        else:
+            for row in rows:
+                self.add(row.id, row.user_id, row.db_instance_id, row.firewall_id)
+        if database_id is None:
+            self._refreshed_at = refreshed_at
+
+    async def lookup_database(self, session, database_id: str) -> Optional[dict]:
+        entry = self.get_database(database_id)
+        if entry is None:
+            await self.refresh(session, database_id=database_id)
+            entry = self.get_database(database_id)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "databases": len(self._by_database),
+                "labels": len(self._by_label),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshed_at": self._refreshed_at,
+            }
+
+
+firewall_index = FirewallIndex()
+
+
+async def run_firewall_index_refresh():
+    while True:
+        await asyncio.sleep(settings.firewall_index_full_refresh_interval)
+        try:
+            async with async_session_maker() as session:
+                await firewall_index.refresh(session, full=True)
+        except Exception as e:
+            print(f"Error refreshing the firewall index: {e}")
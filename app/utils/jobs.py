@@ -0,0 +1,371 @@
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import or_, update
+from sqlalchemy.future import select
+from app.config import settings
+from app.constants.contants import FIREWALL_LABEL
+from app.constants.enums import JobStatus, ProvisioningStep
+from app.models import Database, ProvisioningJob
+from app.models.requests import DatabaseRequest
+from app.utils.db import async_session_maker
+from app.utils.firewall_index import firewall_index
+from app.utils.async_linode import (
+    get_unique_instance_name,
+    create_linode_instance,
+    find_linode_instance_by_label,
+    create_firewall,
+    find_firewall_by_label,
+    add_instance_to_firewall,
+)
+
+PROVISIONING_STEPS = list(ProvisioningStep)
+
+
+def new_provisioning_job(db_request: DatabaseRequest) -> ProvisioningJob:
+    db_id = str(uuid4())
+    return ProvisioningJob(
+        id=str(uuid4()),
+        user_id=db_request.user_id,
+        database_id=db_id,
+        request=db_request.model_dump(mode="json"),
+        status=JobStatus.queued,
+        step=ProvisioningStep.pending,
+        instance_label=get_unique_instance_name(db_id, db_request.db_name),
+        instance_root_password=str(uuid4()),
+        db_root_password=str(uuid4()),
+        attempts=0,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow(),
+    )
+
+
+def describe_job(job: ProvisioningJob) -> dict:
+    completed_steps = PROVISIONING_STEPS.index(job.step)
+    return {
+        "job_id": job.id,
+        "status": job.status.value,
+        "step": job.step.value,
+        "progress": completed_steps / (len(PROVISIONING_STEPS) - 1),
+        "database_id": job.database_id,
+        "instance_id": job.instance_id,
+        "firewall_id": job.firewall_id,
+        "firewall_status": job.firewall_status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+async def _create_instance(job: ProvisioningJob, session):
+    request = job.request
+
+    # A resumed job may have created the instance before it could record it
+    instance = await find_linode_instance_by_label(job.instance_label)
+    if instance is None:
+        instance = await create_linode_instance(
+            label=job.instance_label,
+            db_type=request["db_type"],
+            instance_root_password=job.instance_root_password,
+            db_root_password=job.db_root_password,
+            new_user=request["new_user"],
+            new_user_password=request["new_user_password"],
+            instance_type=request["instance_type"],
+            region=request["region"],
+        )
+
+    job.instance_id = str(instance.id)
+    # The user's password is only needed to create the instance, don't keep it
+    job.request = {k: v for k, v in request.items() if k != "new_user_password"}
+
+
+async def _create_firewall(job: ProvisioningJob, session):
+    label = FIREWALL_LABEL.substitute({"INSTANCE_ID": job.instance_id})
+    firewall = await find_firewall_by_label(label)
+    if firewall is None:
+        # Created with the instance already attached, no separate attach call
+        firewall = await create_firewall(
+            instance_id=job.instance_id,
+            db_type=job.request["db_type"],
+            attach=True,
+        )
+        job.firewall_status = firewall
+    job.firewall_id = str(firewall.get("id"))
+
+
+async def _attach_firewall(job: ProvisioningJob, session):
+    if job.firewall_status is not None:
+        return
+    job.firewall_status = await add_instance_to_firewall(
+        firewall_id=job.firewall_id,
+        instance_id=job.instance_id,
+    )
+
+
+async def _store_database(job: ProvisioningJob, session):
+    if await session.get(Database, job.database_id) is not None:
+        return
+
+    request = job.request
+    session.add(
+        Database(
+            id=job.database_id,
+            user_id=job.user_id,
+            db_type=request["db_type"],
+            db_name=job.instance_label,
+            db_instance_id=job.instance_id,
+            instance_type=request["instance_type"],
+            region=request["region"],
+            db_root_password=job.db_root_password,
+            instance_root_password=job.instance_root_password,
+            firewall_id=job.firewall_id,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        )
+    )
+
+
+STEP_HANDLERS = [
+    (ProvisioningStep.instance_created, _create_instance),
+    (ProvisioningStep.firewall_created, _create_firewall),
+    (ProvisioningStep.firewall_attached, _attach_firewall),
+    (ProvisioningStep.database_stored, _store_database),
+]
+
+
+async def _run_step(handler, job: ProvisioningJob, session):
+    retries = settings.provisioning_step_retries
+    for attempt in range(retries + 1):
+        try:
+            return await handler(job, session)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = settings.provisioning_retry_backoff * 2**attempt
+            print(f"Provisioning job {job.id} step failed ({e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+
+
+def _lease_expired_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.provisioning_job_lease)
+
+
+def _claimable():
+    # Nobody holds the job, or its holder stopped renewing the lease
+    return or_(
+        ProvisioningJob.claimed_by.is_(None),
+        ProvisioningJob.claimed_at < _lease_expired_before(),
+    )
+
+
+async def claim_provisioning_job(session, job_id: str, owner: str) -> bool:
+    """
+    Take the lease of a job for `owner`, so no other worker or replica runs
+    it at the same time. Returns whether the job was claimed.
+    """
+    result = await session.execute(
+        update(ProvisioningJob)
+        .where(
+            ProvisioningJob.id == job_id,
+            ProvisioningJob.status != JobStatus.completed,
+            or_(ProvisioningJob.claimed_by == owner, _claimable()),
+        )
+        .values(
+            status=JobStatus.running,
+            claimed_by=owner,
+            claimed_at=datetime.utcnow(),
+            attempts=ProvisioningJob.attempts + 1,
+            error=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount == 1
+
+
+async def run_provisioning_job(job_id: str, owner: str = None):
+    """
+    Run the remaining steps of a provisioning job, if it can be claimed. The
+    result of every step is committed before the next one starts, so a
+    failed or interrupted job resumes from the last completed step. Jobs
+    created already claimed are run by passing their `owner`.
+    """
+    owner = owner or str(uuid4())
+    async with async_session_maker() as session:
+        if not await claim_provisioning_job(session, job_id, owner):
+            return
+        job = await session.get(ProvisioningJob, job_id)
+
+        try:
+            for step, handler in STEP_HANDLERS:
+                if PROVISIONING_STEPS.index(job.step) >= PROVISIONING_STEPS.index(step):
+                    continue
+                await _run_step(handler, job, session)
+                job.step = step
+                job.claimed_at = datetime.utcnow()
+                await session.commit()
+
+            job.status = JobStatus.completed
+            job.claimed_by = None
+            await session.commit()
+            firewall_index.add(
+                job.database_id, job.user_id, job.instance_id, job.firewall_id
+            )
+        except Exception as e:
+            print(f"Provisioning job {job.id} failed: {e}")
+            await session.rollback()
+            await session.refresh(job)
+            job.status = JobStatus.failed
+            job.error = str(e)
+            job.claimed_by = None
+            await session.commit()
+
+
+# Jobs whose lease expired are run by a worker, they may still be running
+BULK_ITEM_STATUSES = {JobStatus.completed: "created", JobStatus.failed: "failed"}
+
+
+async def provision_databases_bulk(items: list, session) -> list:
+    """
+    Provision many databases as provisioning jobs, with at most
+    bulk_provisioning_concurrency of them running at once. Every job is
+    recorded, in one commit, before any resource is created, so a failed
+    item keeps its progress and can be retried. The jobs are recorded
+    claimed by the request, so only the request runs them. If the request is
+    interrupted, the provisioning workers resume them once the lease expires.
+    Returns one result per item, in request order.
+    """
+    owner = str(uuid4())
+    jobs = [new_provisioning_job(db_request) for db_request in items]
+    for job in jobs:
+        job.claimed_by = owner
+        job.claimed_at = datetime.utcnow()
+    session.add_all(jobs)
+    await session.commit()
+
+    semaphore = asyncio.Semaphore(settings.bulk_provisioning_concurrency)
+    waiting = {job.id for job in jobs}
+
+    async def provision(job_id: str):
+        async with semaphore:
+            waiting.discard(job_id)
+            await run_provisioning_job(job_id, owner)
+        # Jobs still waiting for a slot keep their lease
+        if waiting:
+            async with async_session_maker() as lease_session:
+                await lease_session.execute(
+                    update(ProvisioningJob)
+                    .where(
+                        ProvisioningJob.id.in_(list(waiting)),
+                        ProvisioningJob.claimed_by == owner,
+                    )
+                    .values(claimed_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                await lease_session.commit()
+
+    await asyncio.gather(*(provision(job.id) for job in jobs))
+
+    # The jobs ran in their own sessions
+    result = await session.execute(
+        select(ProvisioningJob)
+        .where(ProvisioningJob.id.in_([job.id for job in jobs]))
+        .execution_options(populate_existing=True)
+    )
+    finished = {job.id: job for job in result.scalars().all()}
+
+    results = []
+    for index, job in enumerate(jobs):
+        job = finished[job.id]
+        results.append(
+            {
+                "index": index,
+                "job_id": job.id,
+                "status": BULK_ITEM_STATUSES.get(job.status, "running"),
+                "database_id": job.database_id,
+                "instance_id": job.instance_id,
+                "firewall_id": job.firewall_id,
+                "instance_type": job.request["instance_type"],
+                "region": job.request["region"],
+                "error": job.error,
+            }
+        )
+    return results
+
+
+class ProvisioningWorkerPool:
+    """
+    Fixed number of asyncio workers consuming provisioning job ids. Jobs are
+    claimed before they run, so the same id submitted by several replicas
+    runs once.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queue: asyncio.Queue = None
+        self._tasks = []
+        self._pending = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"provisioning-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(
+            asyncio.create_task(self._resume(), name="provisioning-resume")
+        )
+
+    def submit(self, job_id: str):
+        if job_id not in self._pending:
+            self._pending.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _resume(self):
+        # Jobs interrupted by a restart, here or on another replica, once
+        # their lease has expired
+        while True:
+            try:
+                async with async_session_maker() as session:
+                    result = await session.execute(
+                        select(ProvisioningJob.id)
+                        .where(
+                            ProvisioningJob.status.in_(
+                                [JobStatus.queued, JobStatus.running]
+                            ),
+                            _claimable(),
+                        )
+                        .order_by(ProvisioningJob.created_at)
+                    )
+                for job_id in result.scalars().all():
+                    self.submit(job_id)
+            except Exception as e:
+                print(f"Error resuming provisioning jobs: {e}")
+            await asyncio.sleep(settings.provisioning_resume_interval)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await run_provisioning_job(job_id)
+            except Exception as e:
+                print(f"Error running provisioning job {job_id}: {e}")
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+        }
+
+
+provisioning_workers = ProvisioningWorkerPool(settings.provisioning_workers)
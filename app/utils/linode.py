@@ -5,12 +5,19 @@ from app.constants.contants import (
     BACKUP_SCRIPTS,
     INSTANCE_DEFAULT_USER,
     BACKUP_SCRIPT_SUFFIXES,
+    BACKUP_SCRIPT_ENV,
+    BACKUP_EXTENSION_CODECS,
+    CODEC_BENCHMARK_SCRIPT,
+    CODEC_BENCHMARK_SCRIPT_SAVE_PATH,
+    BACKUP_RETENTION_TAG,
     MAX_BACKUP_LIMIT,
     BACKUP_SCRIPT_SAVE_PATH,
     S3CFG_CONTENT,
     FIREWALL_LABEL,
     FIREWALL_LABEL_PREFIX,
     BACKUP_FOLDER_CONFIG,
+    BACKUP_LOG_FOLDER_CONFIG,
+    OBJECT_STORAGE_DELETE_BATCH_SIZE,
     FIREWALL_BASIC_CONFIG,
     FIREWALL_SPECIFIC_CONFIGS,
     FIREWALL_ALLOWED_PROTOCOLS,
@@ -19,18 +26,36 @@ from app.constants.contants import (
 )
 from app.resources.resources import (
     client,
-    ssh_client,
-    paramiko,
+    ssh_pool,
+    backup_ssh_pool,
     Instance,
     Firewall,
     object_storage_client,
+    linode_cache,
 )
-from app.constants.enums import DatabaseType
+from app.constants.enums import BackupCodec, DatabaseType
 from app.config import settings
 import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
-from datetime import datetime
-from typing import List, Dict
+from botocore.exceptions import (
+    ClientError,
+    NoCredentialsError,
+    PartialCredentialsError,
+)
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+import json
+import shlex
+import time
+from typing import List, Dict, Iterator, Optional, Tuple
+from app.utils.pagination import encode_cursor, decode_cursor
+from app.utils.crontab import (
+    backup_cron_line,
+    replace_backup_block,
+    read_backup_blocks,
+    describe_cron_line,
+    count_legacy_entries,
+)
+from app.utils.metrics import instrumented, LINODE_API, OBJECT_STORAGE, SSH
 
 
 def get_unique_instance_name(id: str, db_name: str):
@@ -42,20 +67,122 @@ def get_instance_name_from_label(label: str):
     return label.split(".")[0]
 
 
+def _instance_key(instance_id) -> tuple:
+    return ("instance", str(instance_id))
+
+
+def _firewall_key(firewall_id) -> tuple:
+    return ("firewall", str(firewall_id))
+
+
+@instrumented(LINODE_API)
+def load_linode_object(model, object_id):
+    return client.load(model, object_id)
+
+
+def load_instance(instance_id: str) -> Instance:
+    # Loaded at most once per request, see app.utils.cache.request_cache_scope
+    return linode_cache.load_for_request(
+        _instance_key(instance_id), lambda: load_linode_object(Instance, instance_id)
+    )
+
+
+def load_firewall(firewall_id) -> Firewall:
+    return linode_cache.load_for_request(
+        _firewall_key(firewall_id), lambda: load_linode_object(Firewall, firewall_id)
+    )
+
+
+def invalidate_instance(instance_id: str):
+    linode_cache.invalidate(_instance_key(instance_id))
+
+
+def invalidate_firewall(firewall_id):
+    linode_cache.invalidate(_firewall_key(firewall_id))
+
+
+@instrumented(OBJECT_STORAGE)
+def delete_objects(
+    keys: List[str], bucket_name: str = settings.linode_db_backup_bucket
+) -> dict:
+    """
+    Delete keys with batched delete_objects calls, retrying the keys that
+    failed. Returns how many objects were deleted and the keys that could not
+    be deleted with their error.
+    """
+    deleted = 0
+    failed = {}
+
+    for i in range(0, len(keys), OBJECT_STORAGE_DELETE_BATCH_SIZE):
+        pending = keys[i : i + OBJECT_STORAGE_DELETE_BATCH_SIZE]
+        errors = {}
+        for attempt in range(settings.object_storage_delete_retries + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+            try:
+                response = object_storage_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={
+                        "Objects": [{"Key": key} for key in pending],
+                        "Quiet": True,
+                    },
+                )
+            except (NoCredentialsError, PartialCredentialsError):
+                raise
+            except Exception as e:
+                errors = {key: str(e) for key in pending}
+                continue
+
+            # In quiet mode only the failed keys are reported
+            errors = {
+                error["Key"]: error.get("Message", error.get("Code"))
+                for error in response.get("Errors", [])
+            }
+            deleted += len(pending) - len(errors)
+            pending = list(errors)
+            if not pending:
+                break
+        failed.update(errors)
+
+    return {"deleted": deleted, "failed": failed}
+
+
+@instrumented(OBJECT_STORAGE)
 def delete_all_objects_from_folder(
     bucket_name: str = settings.linode_db_backup_bucket, folder: str = ""
-):
+) -> dict:
+    """
+    Delete every object under a prefix. Listing pages are deleted in the
+    background while the next page is being listed.
+    """
+    deleted = 0
+    failed = {}
 
     try:
-        # List all objects in the specified bucket
-        response = object_storage_client.list_objects_v2(
-            Bucket=bucket_name, Prefix=folder
+        paginator = object_storage_client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=bucket_name,
+            Prefix=folder,
+            PaginationConfig={"PageSize": OBJECT_STORAGE_DELETE_BATCH_SIZE},
         )
 
-        if "Contents" in response:
-            for obj in response["Contents"]:
-                # Delete each object
-                object_storage_client.delete_object(Bucket=bucket_name, Key=obj["Key"])
+        with ThreadPoolExecutor(
+            max_workers=settings.object_storage_delete_concurrency,
+            thread_name_prefix="object-storage-delete",
+        ) as pool:
+            batches = [
+                pool.submit(
+                    delete_objects,
+                    [obj["Key"] for obj in response["Contents"]],
+                    bucket_name,
+                )
+                for response in pages
+                if response.get("Contents")
+            ]
+            for batch in batches:
+                result = batch.result()
+                deleted += result["deleted"]
+                failed.update(result["failed"])
     except NoCredentialsError:
         print("Credentials not available.")
     except PartialCredentialsError:
@@ -63,6 +190,8 @@ def delete_all_objects_from_folder(
     except Exception as e:
         print(f"An error occurred: {e}")
 
+    return {"deleted": deleted, "failed": failed}
+
 
 def get_backup_script_content(db_type: str):
     if db_type in SUPPORTED_DATABASES:
@@ -73,11 +202,17 @@ def get_backup_script_content(db_type: str):
         )
 
 
+@instrumented(LINODE_API)
 def get_server_ip(instance_id: str) -> str:
     try:
-        instance = client.load(Instance, instance_id)
+        ipv4 = linode_cache.get_or_load(
+            _instance_key(instance_id),
+            "ipv4",
+            settings.linode_cache_specs_ttl,
+            lambda: list(load_instance(instance_id).ipv4),
+        )
         # Assuming you want the public IPv4 address
-        ip_address = instance.ipv4[0] if instance.ipv4 else None
+        ip_address = ipv4[0] if ipv4 else None
         if not ip_address:
             raise ValueError("No public IPv4 address found for the instance.")
         return ip_address
@@ -87,6 +222,7 @@ def get_server_ip(instance_id: str) -> str:
         )
 
 
+@instrumented(LINODE_API)
 def create_linode_instance(
     label,
     db_type,
@@ -129,20 +265,55 @@ def create_linode_instance(
     return instance
 
 
+@instrumented(LINODE_API)
+def find_linode_instance_by_label(label: str):
+    """
+    Look up an instance by its (unique) label, used to resume provisioning
+    without creating the same instance twice.
+    """
+    try:
+        instances = client.linode.instances(Instance.label == label)
+        return instances[0] if len(instances) > 0 else None
+    except Exception as e:
+        raise ValueError(f"Error looking up Linode instance {label}: {str(e)}")
+
+
+@instrumented(LINODE_API)
 def get_instance_status(instance_id: str):
     try:
-        instance: Instance = client.load(Instance, instance_id)
-        return instance.status
+        return linode_cache.get_or_load(
+            _instance_key(instance_id),
+            "status",
+            settings.linode_cache_status_ttl,
+            lambda: load_instance(instance_id).status,
+        )
     except Exception as e:
         raise ValueError(
             f"Error retrieving status for Linode instance {instance_id}: {str(e)}"
         )
 
 
+@instrumented(LINODE_API)
+def list_instance_statuses() -> dict:
+    """
+    Status of every instance on the account, read with one paginated listing
+    instead of one load per instance. Also refreshes the cached statuses.
+    """
+    try:
+        statuses = {}
+        for instance in client.linode.instances():
+            statuses[str(instance.id)] = instance.status
+            linode_cache.set(_instance_key(instance.id), "status", instance.status)
+        return statuses
+    except Exception as e:
+        raise ValueError(f"Error listing Linode instances: {str(e)}")
+
+
+@instrumented(LINODE_API)
 def get_linode_stats(instance_id: str):
     try:
 
-        instance: Instance = client.load(Instance, instance_id)
+        instance: Instance = load_instance(instance_id)
         try:
             stats = instance.stats
             stats = stats.get("data", {})
@@ -157,11 +328,12 @@ def get_linode_stats(instance_id: str):
         )
 
 
+@instrumented(LINODE_API)
 def update_linode_instance(
     instance_id: str, instance_type: str = None, instance_name: str = None
 ):
     try:
-        instance: Instance = client.load(Instance, instance_id)
+        instance: Instance = load_instance(instance_id)
 
         if instance_type:
             status = instance.resize(instance_type)
@@ -174,35 +346,183 @@ def update_linode_instance(
         instance.save()
     except Exception as e:
         raise ValueError(f"Error updating Linode instance {instance_id}: {str(e)}")
+    finally:
+        invalidate_instance(instance_id)
 
 
+@instrumented(LINODE_API)
 def delete_linode_instance(instance_id: str):
     try:
-        instance = client.load(Instance, instance_id)
+        instance = load_instance(instance_id)
         instance.delete()
     except Exception as e:
         raise ValueError(f"Error deleting Linode instance {instance_id}: {str(e)}")
+    finally:
+        invalidate_instance(instance_id)
 
 
+@instrumented(LINODE_API)
 def get_linode_instance_details(instance_id: str) -> dict:
     try:
-        instance = client.load(Instance, instance_id)
-        instance_details = {
-            "label": instance.label,
-            "specs": {
-                "disk": instance.specs.disk,
-                "gpus": instance.specs.gpus,
-                "memory": instance.specs.memory,
-                "transfer": instance.specs.transfer,
-                "vcpus": instance.specs.vcpus,
-            },
-            "status": instance.status,
-        }
+
+        def load_details():
+            instance = load_instance(instance_id)
+            return {
+                "label": instance.label,
+                "specs": {
+                    "disk": instance.specs.disk,
+                    "gpus": instance.specs.gpus,
+                    "memory": instance.specs.memory,
+                    "transfer": instance.specs.transfer,
+                    "vcpus": instance.specs.vcpus,
+                },
+            }
+
+        # Label and specs rarely change, the status does
+        details = linode_cache.get_or_load(
+            _instance_key(instance_id),
+            "details",
+            settings.linode_cache_specs_ttl,
+            load_details,
+        )
+        instance_details = {**details, "status": get_instance_status(instance_id)}
         return instance_details
     except Exception as e:
         raise ValueError(f"Error retrieving Linode instance {instance_id}: {str(e)}")
 
 
+def get_backup_command(
+    database_id: str,
+    user_id: str,
+    instance_id: str,
+    db_type: str,
+    db_password: str,
+    db_name: str = "all",
+    codec: str = "gzip",
+    compression_level: int = None,
+    compression_threads: int = 0,
+    retention_days: int = None,
+    run_id: str = None,
+) -> str:
+    """
+    The backup script invocation, with its environment and arguments. A
+    `run_id` is logged in the summary, so the ingested log of a run started
+    by the scheduler updates its backup_runs row.
+    """
+    env = BACKUP_SCRIPT_ENV.substitute(
+        {
+            "CODEC": codec,
+            "LEVEL": compression_level or "",
+            "THREADS": compression_threads,
+            "RETENTION_DAYS": retention_days or "",
+        }
+    )
+    suffix = BACKUP_SCRIPT_SUFFIXES[db_type].substitute(
+        {
+            "DB_HOST": "localhost",
+            "DB_USER": "root",
+            "DB_PASSWORD": db_password,
+            "DB_NAME": db_name,
+            "BUCKET_NAME": settings.linode_db_backup_bucket,
+            "OBJECT_STORAGE_REGION": settings.linode_db_backup_bucket_region,
+            "MAX_BACKUPS": MAX_BACKUP_LIMIT,
+            "BACKUP_FILE_PREFIX": instance_id,
+            "USER_ID": user_id,
+            "DB_TYPE": db_type,
+            "DB_ID": database_id,
+        }
+    )
+    if run_id:
+        # Only set for single runs, cron lines stay the same
+        env = f"{env} BACKUP_RUN_ID={run_id}"
+    return f"{env} {BACKUP_SCRIPT_SAVE_PATH} {suffix}"
+
+
+def _missing_commands(conn, commands: List[str]) -> List[str]:
+    checks = "; ".join(
+        f"command -v {command} > /dev/null || echo {command}" for command in commands
+    )
+    _, stdout, _ = conn.exec_command(checks)
+    missing = stdout.read().decode().split()
+    stdout.channel.recv_exit_status()
+    return missing
+
+
+def _ensure_backup_tools(conn, commands: List[str]):
+    """
+    Install the commands the backup script needs when the instance lacks
+    them, the script would otherwise fall back to something else than what
+    was scheduled. Raises ValueError if they are still missing.
+    """
+    missing = _missing_commands(conn, commands)
+    if not missing:
+        return
+    packages = " ".join(missing)
+    _, stdout, _ = conn.exec_command(
+        "export DEBIAN_FRONTEND=noninteractive; apt-get update -q > /dev/null"
+        f" && apt-get install -y -q {packages} > /dev/null 2>&1",
+        timeout=settings.backup_tools_install_timeout,
+    )
+    stdout.channel.recv_exit_status()
+    missing = _missing_commands(conn, missing)
+    if missing:
+        raise ValueError(
+            f"{', '.join(missing)} is not installed on the instance and could not be installed."
+        )
+
+
+def _upload_backup_script(conn, db_type: str):
+    sftp = conn.sftp()
+    with sftp.file(BACKUP_SCRIPT_SAVE_PATH, "w") as script_file:
+        script_file.write(get_backup_script_content(db_type))
+    sftp.chmod(BACKUP_SCRIPT_SAVE_PATH, 0o755)
+
+
+def parse_backup_summary(output: str) -> Optional[dict]:
+    """
+    Fields of the last BACKUP_SUMMARY line logged by the backup script.
+    """
+    summary = None
+    for line in output.splitlines():
+        if "BACKUP_SUMMARY " not in line:
+            continue
+        fields = line.split("BACKUP_SUMMARY ", 1)[1].split()
+        summary = dict(field.split("=", 1) for field in fields if "=" in field)
+    if summary is None:
+        return None
+    for field in ("duration", "bytes", "upload_seconds"):
+        try:
+            summary[field] = int(summary[field])
+        except (KeyError, ValueError):
+            summary[field] = None
+    # Failed runs log an empty key, cron runs an empty run id
+    summary["key"] = summary.get("key") or None
+    summary["run_id"] = summary.get("run_id") or None
+    return summary
+
+
+def _read_crontab(conn) -> str:
+    _, stdout, _ = conn.exec_command("crontab -l 2>/dev/null")
+    crontab = stdout.read().decode()
+    stdout.channel.recv_exit_status()
+    return crontab
+
+
+def _set_backup_cron_block(conn, database_id: str, entries: List[Tuple[str, str]]):
+    # Rewrites the crontab only when the database's block changes
+    crontab = _read_crontab(conn)
+    updated = replace_backup_block(crontab, database_id, entries)
+    if updated == crontab:
+        return
+
+    stdin, stdout, stderr = conn.exec_command("crontab -")
+    stdin.write(updated)
+    stdin.channel.shutdown_write()
+    if stdout.channel.recv_exit_status() != 0:
+        raise ValueError(f"Failed to install the crontab: {stderr.read().decode()}")
+
+
+@instrumented(SSH)
 def deploy_backup_script(
     database_id: str,
     user_id: str,
@@ -211,96 +531,490 @@ def deploy_backup_script(
     cron_schedule: str,
     ssh_password: str,
     db_password: str,
+    schedule_id: str,
     db_name: str = "all",
     ssh_username: str = INSTANCE_DEFAULT_USER,
+    codec: str = "gzip",
+    compression_level: int = None,
+    compression_threads: int = 0,
+    start_delay_seconds: int = 0,
+    install_cron: bool = True,
+    retention_days: int = None,
 ):
+    """
+    Upload the backup script and make the database's crontab block hold a
+    single entry for the schedule, replacing whatever it held before. The
+    streaming uploader and the codec are installed if missing, a ValueError
+    is raised when they can't be.
+    """
+    backup_command = get_backup_command(
+        database_id=database_id,
+        user_id=user_id,
+        instance_id=instance_id,
+        db_type=db_type,
+        db_password=db_password,
+        db_name=db_name,
+        codec=codec,
+        compression_level=compression_level,
+        compression_threads=compression_threads,
+        retention_days=retention_days,
+    )
 
-    def add_cron_job_suffix():
-        suffix = BACKUP_SCRIPT_SUFFIXES[db_type]
-        final_suffix = suffix.substitute(
-            {
-                "DB_HOST": "localhost",
-                "DB_USER": "root",
-                "DB_PASSWORD": db_password,
-                "DB_NAME": db_name,
-                "BUCKET_NAME": settings.linode_db_backup_bucket,
-                "OBJECT_STORAGE_REGION": settings.linode_db_backup_bucket_region,
-                "MAX_BACKUPS": MAX_BACKUP_LIMIT,
-                "BACKUP_FILE_PREFIX": instance_id,
-                "USER_ID": user_id,
-                "DB_TYPE": db_type,
-                "DB_ID": database_id,
-            }
-        )
+    server_ip = get_server_ip(instance_id)
 
-        return final_suffix
+    try:
+
+        with ssh_pool.connection(server_ip, ssh_username, ssh_password) as conn:
+
+            # s3cmd streams the backup and tags it for the lifecycle rules,
+            # and the script fails rather than run another codec
+            _ensure_backup_tools(
+                conn, ["s3cmd"] + ([codec] if codec != BackupCodec.gzip.value else [])
+            )
+
+            # Transfer the backup script
+            _upload_backup_script(conn, db_type)
+
+            # The control plane scheduler runs the script itself, so the
+            # block is emptied rather than left to fire a second backup
+            entries = []
+            if install_cron:
+                entries.append(
+                    (
+                        schedule_id,
+                        backup_cron_line(
+                            cron_schedule, start_delay_seconds, backup_command
+                        ),
+                    )
+                )
+            _set_backup_cron_block(conn, database_id, entries)
 
+        print("Backup script deployed successfully.")
+        return 0
+    except ValueError:
+        raise
+    except Exception as e:
+        print(f"Error deploying backup script: {e}")
+        return 1
+
+
+@instrumented(SSH)
+def set_backup_cron(
+    instance_id: str,
+    database_id: str,
+    ssh_password: str,
+    entries: List[Tuple[str, str]],
+    ssh_username: str = INSTANCE_DEFAULT_USER,
+):
+    """
+    Replace the database's crontab block with (schedule_id, cron line)
+    entries, removing it when there are none.
+    """
     server_ip = get_server_ip(instance_id)
+    with ssh_pool.connection(server_ip, ssh_username, ssh_password) as conn:
+        _set_backup_cron_block(conn, database_id, entries)
 
-    backup_script_content = get_backup_script_content(db_type)
 
-    ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+@instrumented(SSH)
+def list_backup_cron(
+    instance_id: str,
+    database_id: str,
+    ssh_password: str,
+    ssh_username: str = INSTANCE_DEFAULT_USER,
+) -> dict:
+    """
+    The backup entries installed for a database, and how many untagged
+    entries of it are left over from before the blocks. `lines` holds the
+    installed (schedule_id, cron line) pairs, with the database password,
+    and must not be returned to clients.
+    """
+    server_ip = get_server_ip(instance_id)
+    with ssh_pool.connection(server_ip, ssh_username, ssh_password) as conn:
+        crontab = _read_crontab(conn)
+
+    lines = read_backup_blocks(crontab).get(database_id, [])
+    return {
+        "entries": [
+            describe_cron_line(schedule_id, line) for schedule_id, line in lines
+        ],
+        "lines": lines,
+        "legacy_entries": count_legacy_entries(crontab, database_id),
+    }
 
-    try:
 
-        ssh_client.connect(server_ip, username=ssh_username, password=ssh_password)
+@instrumented(SSH)
+def run_backup_script(
+    database_id: str,
+    user_id: str,
+    instance_id: str,
+    db_type: str,
+    ssh_password: str,
+    db_password: str,
+    ssh_username: str = INSTANCE_DEFAULT_USER,
+    **options,
+) -> dict:
+    """
+    Run a backup now and wait for it, returning the script's exit status and
+    its BACKUP_SUMMARY fields.
+    """
+    backup_command = get_backup_command(
+        database_id=database_id,
+        user_id=user_id,
+        instance_id=instance_id,
+        db_type=db_type,
+        db_password=db_password,
+        **options,
+    )
+    server_ip = get_server_ip(instance_id)
+
+    with backup_ssh_pool.connection(server_ip, ssh_username, ssh_password) as conn:
+        _upload_backup_script(conn, db_type)
+        _, stdout, _ = conn.exec_command(
+            backup_command, timeout=settings.backup_run_timeout
+        )
+        output = stdout.read().decode()
+        exit_status = stdout.channel.recv_exit_status()
+
+    return {
+        "exit_status": exit_status,
+        "summary": parse_backup_summary(output),
+    }
 
-        # Transfer the backup script
-        sftp = ssh_client.open_sftp()
-        script_path = BACKUP_SCRIPT_SAVE_PATH
+
+@instrumented(SSH)
+def run_codec_benchmark(
+    instance_id: str,
+    ssh_password: str,
+    db_password: str,
+    sample_mb: int,
+    db_name: str = "all",
+    ssh_username: str = INSTANCE_DEFAULT_USER,
+):
+    """
+    Compress a sample dump with every codec installed on the instance and
+    return the throughput and ratio of each.
+    """
+    server_ip = get_server_ip(instance_id)
+
+    with ssh_pool.connection(server_ip, ssh_username, ssh_password) as conn:
+        sftp = conn.sftp()
+        script_path = CODEC_BENCHMARK_SCRIPT_SAVE_PATH
         with sftp.file(script_path, "w") as script_file:
-            script_file.write(backup_script_content)
-        sftp.chmod(script_path, 755)
-        sftp.close()
+            script_file.write(CODEC_BENCHMARK_SCRIPT)
+        sftp.chmod(script_path, 0o755)
+
+        command = " ".join(
+            shlex.quote(str(arg))
+            for arg in (
+                script_path,
+                "localhost",
+                "root",
+                db_password,
+                db_name,
+                int(sample_mb),
+            )
+        )
+        _, stdout, stderr = conn.exec_command(command)
+        output = stdout.read().decode()
+        if stdout.channel.recv_exit_status() != 0:
+            raise ValueError(f"Codec benchmark failed: {stderr.read().decode()}")
+
+    results = [json.loads(line) for line in output.splitlines() if line.strip()]
+    return sorted(results, key=lambda result: result["throughput_mb_s"], reverse=True)
 
-        # Add the cron job
-        cron_command = f'(crontab -l 2>/dev/null; echo "{cron_schedule} {script_path} {add_cron_job_suffix()}") | crontab -'
 
-        print(cron_command)
+def get_backup_folder(user_id: str, database_type: str, db_id: str) -> str:
+    folder = BACKUP_FOLDER_CONFIG.substitute(
+        {"DATABASE_TYPE": database_type, "USER_ID": user_id, "DB_ID": db_id}
+    )
+    return f"{folder}/"
 
-        _, _, stderr = ssh_client.exec_command(cron_command)
-        errors = stderr.read().decode()
-        if errors:
-            raise ValueError(f"Failed to add cron job: {errors}")
 
-        print("Backup script deployed and cron job added successfully.")
-        ssh_client.close()
-        return 0
-    except Exception as e:
-        print(f"Error deploying backup script: {e}")
-        ssh_client.close()
-        return 1
+def _month_prefix(folder: str, year: int, month: int) -> str:
+    # Backups are stored as <folder>/YYYY/MM/<prefix>_<YYYY-MM-DD_HH-MM-SS>.gz
+    return f"{folder}{year:04d}/{month:02d}/"
+
+
+BACKUP_TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+
+def get_backup_timestamp(key: str) -> Optional[datetime]:
+    # <prefix>_<YYYY-MM-DD_HH-MM-SS>.<extension>
+    name = key.rsplit("/", 1)[-1].split(".", 1)[0]
+    try:
+        return datetime.strptime(name[-19:], BACKUP_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
 
 
+def get_backup_codec(key: str) -> Optional[str]:
+    # The extension records how the backup was compressed
+    extension = key.rsplit("/", 1)[-1].rsplit(".", 1)[-1]
+    return BACKUP_EXTENSION_CODECS.get(extension)
+
+
+def _backup_from_object(obj: dict) -> dict:
+    return {
+        "id": obj["Key"],
+        "last_modified": obj["LastModified"],
+        "size": obj["Size"],
+        "codec": get_backup_codec(obj["Key"]),
+    }
+
+
+def iter_backup_pages(
+    user_id: str,
+    database_type: str,
+    db_id: str,
+    start_after: str = None,
+    from_date: date = None,
+    to_date: date = None,
+    page_size: int = 1000,
+    bucket_name=settings.linode_db_backup_bucket,
+) -> Iterator[List[dict]]:
+    """
+    Yield the backups of a database one listing page at a time. Date filters
+    use the YEAR/MONTH key layout to start and stop the listing at the right
+    month instead of scanning the whole prefix.
+    """
+    folder = get_backup_folder(user_id, database_type, db_id)
+
+    start = start_after or ""
+    if from_date:
+        # Strictly greater than "<folder>YYYY/MM" is the first key of that month
+        month_start = _month_prefix(folder, from_date.year, from_date.month)
+        start = max(start, month_start[:-1])
+
+    stop = None
+    if to_date:
+        if to_date.month == 12:
+            stop = _month_prefix(folder, to_date.year + 1, 1)
+        else:
+            stop = _month_prefix(folder, to_date.year, to_date.month + 1)
+
+    params = {"Bucket": bucket_name, "Prefix": folder}
+    if start:
+        params["StartAfter"] = start
+
+    paginator = object_storage_client.get_paginator("list_objects_v2")
+    responses = paginator.paginate(**params, PaginationConfig={"PageSize": page_size})
+    for response in responses:
+        page = []
+        for obj in response.get("Contents", []):
+            if stop and obj["Key"] >= stop:
+                if page:
+                    yield page
+                return
+            if from_date or to_date:
+                timestamp = get_backup_timestamp(obj["Key"])
+                if timestamp and (
+                    (from_date and timestamp.date() < from_date)
+                    or (to_date and timestamp.date() > to_date)
+                ):
+                    continue
+            page.append(_backup_from_object(obj))
+        if page:
+            yield page
+
+
+@instrumented(OBJECT_STORAGE)
 def get_backups(
     user_id: str,
     database_type: str,
     db_id: str,
     bucket_name=settings.linode_db_backup_bucket,
 ):
-    # get the backups from the object storage, with the prefix backups/user_id/db_id
+    # get all the backups from the object storage, with the prefix backups/user_id/db_id
+    return [
+        backup
+        for page in iter_backup_pages(
+            user_id=user_id,
+            database_type=database_type,
+            db_id=db_id,
+            bucket_name=bucket_name,
+        )
+        for backup in page
+    ]
 
-    folder = BACKUP_FOLDER_CONFIG.substitute(
+
+@instrumented(OBJECT_STORAGE)
+def list_backups_page(
+    user_id: str,
+    database_type: str,
+    db_id: str,
+    limit: int = 100,
+    cursor: str = None,
+    from_date: date = None,
+    to_date: date = None,
+) -> dict:
+    """
+    Return at most `limit` backups and a cursor to the next page, if any.
+    """
+    start_after = None
+    if cursor:
+        start_after = decode_cursor(cursor).get("after")
+        if not isinstance(start_after, str) or not start_after.startswith(
+            get_backup_folder(user_id, database_type, db_id)
+        ):
+            raise ValueError("Invalid cursor")
+
+    backups = []
+    pages = iter_backup_pages(
+        user_id=user_id,
+        database_type=database_type,
+        db_id=db_id,
+        start_after=start_after,
+        from_date=from_date,
+        to_date=to_date,
+        page_size=min(limit + 1, 1000),
+    )
+    # Fetch one extra item to know whether another page exists
+    for page in pages:
+        backups.extend(page)
+        if len(backups) > limit:
+            break
+    pages.close()
+
+    next_cursor = None
+    if len(backups) > limit:
+        backups = backups[:limit]
+        next_cursor = encode_cursor({"after": backups[-1]["id"]})
+
+    return {"backups": backups, "next_cursor": next_cursor}
+
+
+def get_backup_log_folder(user_id: str, database_type: str, db_id: str) -> str:
+    folder = BACKUP_LOG_FOLDER_CONFIG.substitute(
         {"DATABASE_TYPE": database_type, "USER_ID": user_id, "DB_ID": db_id}
     )
+    return f"{folder}/"
 
-    response = object_storage_client.list_objects_v2(Bucket=bucket_name, Prefix=folder)
 
-    backups = []
+def iter_backup_log_pages(
+    user_id: str,
+    database_type: str,
+    db_id: str,
+    start_after: str = None,
+    page_size: int = 1000,
+    bucket_name=settings.linode_db_backup_bucket,
+) -> Iterator[List[dict]]:
+    """
+    Yield the run logs of a database one listing page at a time, oldest
+    first since their keys end with the run's timestamp.
+    """
+    params = {
+        "Bucket": bucket_name,
+        "Prefix": get_backup_log_folder(user_id, database_type, db_id),
+    }
+    if start_after:
+        params["StartAfter"] = start_after
 
-    if "Contents" in response:
-        backups = [
+    paginator = object_storage_client.get_paginator("list_objects_v2")
+    responses = paginator.paginate(**params, PaginationConfig={"PageSize": page_size})
+    for response in responses:
+        page = [
             {
                 "id": obj["Key"],
                 "last_modified": obj["LastModified"],
                 "size": obj["Size"],
             }
-            for obj in response["Contents"]
+            for obj in response.get("Contents", [])
         ]
+        if page:
+            yield page
+
+
+@instrumented(OBJECT_STORAGE)
+def get_backup_log(key: str, bucket_name=settings.linode_db_backup_bucket) -> str:
+    response = object_storage_client.get_object(Bucket=bucket_name, Key=key)
+    return response["Body"].read().decode("utf-8", errors="replace")
+
+
+@instrumented(OBJECT_STORAGE)
+def delete_database_backups(user_id: str, database_type: str, db_id: str) -> dict:
+    # Backups and their run logs
+    result = {"deleted": 0, "failed": {}}
+    for folder in (
+        get_backup_folder(user_id, database_type, db_id),
+        get_backup_log_folder(user_id, database_type, db_id),
+    ):
+        folder_result = delete_all_objects_from_folder(folder=folder)
+        result["deleted"] += folder_result["deleted"]
+        result["failed"].update(folder_result["failed"])
+    return result
+
 
-    return backups
+def _retention_rule_id(days: int) -> str:
+    return f"{BACKUP_RETENTION_TAG}:{days}"
 
 
+def _is_retention_rule(rule: dict) -> bool:
+    return rule.get("ID", "").startswith(f"{BACKUP_RETENTION_TAG}:")
+
+
+def _get_lifecycle_rules(bucket_name: str) -> List[dict]:
+    try:
+        response = object_storage_client.get_bucket_lifecycle_configuration(
+            Bucket=bucket_name
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchLifecycleConfiguration":
+            return []
+        raise
+    return response.get("Rules", [])
+
+
+def _put_lifecycle_rules(bucket_name: str, rules: List[dict]):
+    if rules:
+        object_storage_client.put_bucket_lifecycle_configuration(
+            Bucket=bucket_name, LifecycleConfiguration={"Rules": rules}
+        )
+    else:
+        object_storage_client.delete_bucket_lifecycle(Bucket=bucket_name)
+
+
+@instrumented(OBJECT_STORAGE)
+def set_retention_rules(
+    retention_days: List[int],
+    max_rules: int,
+    bucket_name: str = settings.linode_db_backup_bucket,
+) -> List[int]:
+    """
+    Make the bucket hold one lifecycle rule per retention, expiring the
+    objects tagged with it. Retentions in use come first, in the given order,
+    then the ones already having a rule, up to max_rules. Other rules are
+    kept. The caller serializes concurrent rewrites, since the configuration
+    is replaced as a whole.
+    """
+    rules = _get_lifecycle_rules(bucket_name)
+    existing = [
+        int(rule["Expiration"]["Days"]) for rule in rules if _is_retention_rule(rule)
+    ]
+    days = list(dict.fromkeys([int(d) for d in retention_days] + existing))
+    days = sorted(days[:max_rules])
+    if days == sorted(existing):
+        return days
+
+    new_rules = [
+        {
+            "ID": _retention_rule_id(d),
+            "Filter": {"Tag": {"Key": BACKUP_RETENTION_TAG, "Value": str(d)}},
+            "Status": "Enabled",
+            "Expiration": {"Days": d},
+        }
+        for d in days
+    ]
+    other_rules = [rule for rule in rules if not _is_retention_rule(rule)]
+    _put_lifecycle_rules(bucket_name, other_rules + new_rules)
+    return days
+
+
+@instrumented(OBJECT_STORAGE)
+def delete_backups(backup_ids: List[str]) -> dict:
+    return delete_objects(list(dict.fromkeys(backup_ids)))
+
+
+@instrumented(OBJECT_STORAGE)
 def delete_backup(backup_id: str):
     # delete the backup from the object storage
     try:
@@ -314,14 +1028,21 @@ def delete_backup(backup_id: str):
         return False
 
 
+@instrumented(LINODE_API)
 def add_instance_to_firewall(firewall_id: str, instance_id: str):
     try:
-        firewall: Firewall = client.load(Firewall, firewall_id)
-        firewall.device_create(id=int(instance_id))
+        firewall: Firewall = load_firewall(firewall_id)
+        # Attaching twice is an API error, so a retried attach is a no-op
+        if not any(
+            str(device.entity.id) == str(instance_id) for device in firewall.devices
+        ):
+            firewall.device_create(id=int(instance_id))
         firewall.save(force=True)
         return firewall._raw_json
     except Exception as e:
         raise ValueError(f"Error adding instance to firewall: {str(e)}")
+    finally:
+        invalidate_firewall(firewall_id)
 
 
 def validate_firewall_rules(rules: Dict, db_type: str):
@@ -389,70 +1110,82 @@ def validate_firewall_rules(rules: Dict, db_type: str):
     return True, rules
 
 
-def create_firewall(instance_id: str, db_type: DatabaseType):
+@instrumented(LINODE_API)
+def create_firewall(instance_id: str, db_type: DatabaseType, attach: bool = False):
 
     label = FIREWALL_LABEL.substitute({"INSTANCE_ID": instance_id})
 
     rules = FIREWALL_SPECIFIC_CONFIGS.get(db_type, FIREWALL_BASIC_CONFIG)
 
+    # Attaching on creation saves the separate load, attach and save calls
+    extra = {"devices": {"linodes": [int(instance_id)]}} if attach else {}
+
     try:
-        firewall = client.networking.firewall_create(label=label, rules=rules)
+        firewall = client.networking.firewall_create(label=label, rules=rules, **extra)
         return firewall._raw_json
     except Exception as e:
         raise ValueError(f"Error creating firewall: {str(e)}")
 
 
-def list_firewalls(
-    user_id: str = None, db_id: str = None, filter_str: str = FIREWALL_LABEL_PREFIX
-):
+@instrumented(LINODE_API)
+def find_firewall_by_label(label: str):
     try:
-        firewalls = client.firewalls()
-        firewall_list = [firewall._raw_json for firewall in firewalls]
+        firewalls = client.networking.firewalls(Firewall.label == label)
+        return firewalls[0]._raw_json if len(firewalls) > 0 else None
+    except Exception as e:
+        raise ValueError(f"Error looking up firewall {label}: {str(e)}")
 
-        print(firewall_list)
 
+@instrumented(LINODE_API)
+def list_firewalls(filter_str: str = FIREWALL_LABEL_PREFIX):
+    """
+    List the firewalls whose label contains filter_str. The filter is sent to
+    the Linode API so only matching firewalls are paged through.
+    """
+    try:
         if filter_str:
-            firewall_list = [
-                firewall
-                for firewall in firewall_list
-                if filter_str.lower() in firewall["label"].lower()
-            ]
-
-        # Filter firewalls based on user_id and db_id
-        if user_id and db_id:
-            firewall_list = [
-                firewall
-                for firewall in firewall_list
-                if f"{user_id}.{db_id}" in firewall["label"]
-            ]
-        return firewall_list
+            firewalls = client.networking.firewalls(Firewall.label.contains(filter_str))
+        else:
+            firewalls = client.networking.firewalls()
+        return [firewall._raw_json for firewall in firewalls]
     except Exception as e:
         raise ValueError(f"Error listing firewalls: {str(e)}")
 
 
+@instrumented(LINODE_API)
 def get_firewall(firewall_id: int):
     try:
-        firewall = client.load(Firewall, firewall_id)
-        return firewall._raw_json
+        return linode_cache.get_or_load(
+            _firewall_key(firewall_id),
+            "raw",
+            settings.linode_cache_firewall_ttl,
+            lambda: load_firewall(firewall_id)._raw_json,
+        )
     except Exception as e:
         raise ValueError(f"Error retrieving firewall: {str(e)}")
 
 
+@instrumented(LINODE_API)
 def update_firewall(firewall_id: int, rules: dict = None):
     try:
-        firewall: Firewall = client.load(Firewall, firewall_id)
+        firewall: Firewall = load_firewall(firewall_id)
         if rules:
             firewall.update_rules(rules=rules)
         firewall.save(force=True)
         return firewall._raw_json
     except Exception as e:
         raise ValueError(f"Error updating firewall: {str(e)}")
+    finally:
+        invalidate_firewall(firewall_id)
 
 
+@instrumented(LINODE_API)
 def delete_firewall(firewall_id: int):
     try:
-        firewall = client.load(Firewall, firewall_id)
+        firewall = load_firewall(firewall_id)
         firewall.delete()
         return True
     except Exception as e:
         raise ValueError(f"Error deleting firewall: {str(e)}")
+    finally:
+        invalidate_firewall(firewall_id)
@@ -0,0 +1,264 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LINODE_API = "linode_api"
+OBJECT_STORAGE = "object_storage"
+SSH = "ssh"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                labels = _format_labels(self.label_names, key, le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# A collector returns (name, type, help, [(labels dict, value), ...]) tuples
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[dict, float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    values = tuple(labels[n] for n in names)
+                    lines.append(
+                        f"{name}{_format_labels(names, values)} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Latency of HTTP requests by route.",
+        ("method", "route"),
+    )
+)
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route and status code.",
+        ("method", "route", "status"),
+    )
+)
+upstream_call_duration = registry.register(
+    Histogram(
+        "upstream_call_duration_seconds",
+        "Latency of calls to the Linode API, object storage and SSH.",
+        ("upstream", "function"),
+    )
+)
+upstream_call_errors = registry.register(
+    Counter(
+        "upstream_call_errors_total",
+        "Failed calls to the Linode API, object storage and SSH.",
+        ("upstream", "function"),
+    )
+)
+upstream_calls_in_flight = registry.register(
+    Gauge(
+        "upstream_calls_in_flight",
+        "Calls to the Linode API, object storage and SSH in progress.",
+        ("upstream", "function"),
+    )
+)
+db_session_duration = registry.register(
+    Histogram(
+        "db_session_duration_seconds",
+        "Lifetime of metadata DB sessions opened by get_db.",
+    )
+)
+db_session_errors = registry.register(
+    Counter(
+        "db_session_errors_total", "get_db sessions that ended with a database error."
+    )
+)
+db_sessions_in_flight = registry.register(
+    Gauge("db_sessions_in_flight", "Metadata DB sessions currently open by get_db.")
+)
+
+linode_api_throttled = registry.register(
+    Counter(
+        "linode_api_throttled_total",
+        "Linode API requests delayed by the client token bucket or a 429.",
+        ("reason",),
+    )
+)
+linode_api_retries = registry.register(
+    Counter(
+        "linode_api_retries_total",
+        "Linode API requests retried after a 429 or 5xx response.",
+        ("status",),
+    )
+)
+linode_api_coalesced = registry.register(
+    Counter(
+        "linode_api_coalesced_total",
+        "Linode API GETs served by an identical request already in flight.",
+    )
+)
+linode_api_rate_limit_wait = registry.register(
+    Histogram(
+        "linode_api_rate_limit_wait_seconds",
+        "Time Linode API requests waited for the client token bucket.",
+    )
+)
+
+
+def instrumented(upstream: str):
+    """
+    Record latency, errors and in-flight calls of a function that talks to
+    an upstream service.
+    """
+
+    def decorator(func):
+        labels = {"upstream": upstream, "function": func.__name__}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            upstream_calls_in_flight.inc(**labels)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                upstream_call_errors.inc(**labels)
+                raise
+            finally:
+                upstream_call_duration.observe(time.perf_counter() - started, **labels)
+                upstream_calls_in_flight.dec(**labels)
+
+        return wrapper
+
+    return decorator
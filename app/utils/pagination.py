@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Turn a position in a listing into an opaque, URL-safe cursor.
+    """
+    raw = json.dumps(position, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def encode_keyset_cursor(created_at: datetime, row_id: str) -> str:
+    return encode_cursor({"created_at": created_at.isoformat(), "id": row_id})
+
+
+def decode_keyset_cursor(cursor: str) -> Tuple[datetime, str]:
+    position = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(position["created_at"]), str(position["id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_after(created_at_column, id_column, cursor: str):
+    """
+    Condition selecting the rows after the cursor in (created_at, id) order.
+    """
+    created_at, row_id = decode_keyset_cursor(cursor)
+    return or_(
+        created_at_column > created_at,
+        and_(created_at_column == created_at, id_column > row_id),
+    )
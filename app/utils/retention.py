@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import func, text, union, update
+from sqlalchemy.future import select
+from app.config import settings
+from app.constants.contants import DEFAULT_BACKUP_RETENTION_DAYS
+from app.models import Database, Backup, BackupRun, BackupSchedule
+from app.utils.db import async_session_maker
+from app.utils.async_linode import set_retention_rules, delete_backups
+from app.utils.backup_catalog import remove_from_catalog
+
+# MySQL named lock serializing lifecycle rewrites across every process
+LIFECYCLE_LOCK_NAME = "backup_lifecycle_rules"
+
+
+async def get_retention_days(session, database_id: str) -> Optional[int]:
+    # With several schedules the longest retention wins
+    result = await session.execute(
+        select(func.max(BackupSchedule.retention_days)).where(
+            BackupSchedule.database_id == database_id
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def sync_lifecycle_rules() -> List[int]:
+    """
+    Make the bucket's retention rules cover the retentions in use, one rule
+    per distinct value, the most used first up to backup_lifecycle_max_rules
+    (far below the 1000 rules a configuration allows). Backups of the other
+    retentions are left to the sweeper. Every process takes the same MySQL
+    named lock, so concurrent rewrites don't drop each other's rules. Rules
+    are never removed per database, so the backups of a deleted database
+    still expire.
+    """
+    # A session of its own, the lock belongs to its connection
+    async with async_session_maker() as session:
+        locked = await session.scalar(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {
+                "name": LIFECYCLE_LOCK_NAME,
+                "timeout": settings.backup_lifecycle_lock_timeout,
+            },
+        )
+        if locked != 1:
+            raise ValueError("Timed out waiting for the lifecycle rules lock")
+        try:
+            result = await session.execute(
+                select(BackupSchedule.retention_days)
+                .group_by(BackupSchedule.retention_days)
+                .order_by(func.count(BackupSchedule.id).desc())
+            )
+            retentions = result.scalars().all()
+            if len(retentions) > settings.backup_lifecycle_max_rules:
+                print(
+                    f"{len(retentions)} retentions in use, the backups of "
+                    f"{len(retentions) - settings.backup_lifecycle_max_rules} "
+                    "of them only expire through the sweeper"
+                )
+            # Rules of retentions no longer used are kept while there is room,
+            # objects tagged with them may remain
+            return await set_retention_rules(
+                retentions, max_rules=settings.backup_lifecycle_max_rules
+            )
+        finally:
+            await session.execute(
+                text("SELECT RELEASE_LOCK(:name)"), {"name": LIFECYCLE_LOCK_NAME}
+            )
+
+
+async def apply_backup_retention(session, database: Database) -> Optional[int]:
+    """
+    Make sure the bucket has a lifecycle rule for the retention of a
+    database's schedules, which its backups are tagged with.
+    """
+    days = await get_retention_days(session, database.id)
+    if settings.backup_lifecycle_enabled and days is not None:
+        await sync_lifecycle_rules()
+    return days
+
+
+async def sweep_expired_backups(session) -> dict:
+    """
+    Delete the catalogued backups and ingested run logs older than their
+    database's retention, in batches. This is the main retention mechanism:
+    lifecycle rules only expire the backups tagged when they were uploaded.
+    Databases without a schedule left, e.g. deleted ones, keep theirs for
+    the default retention.
+    """
+    retentions = (
+        select(
+            BackupSchedule.database_id,
+            func.max(BackupSchedule.retention_days).label("days"),
+        )
+        .group_by(BackupSchedule.database_id)
+        .subquery()
+    )
+    databases = union(
+        select(Backup.database_id), select(BackupRun.database_id)
+    ).subquery()
+    result = await session.execute(
+        select(
+            databases.c.database_id,
+            func.coalesce(retentions.c.days, DEFAULT_BACKUP_RETENTION_DAYS),
+        ).outerjoin(retentions, retentions.c.database_id == databases.c.database_id)
+    )
+    now = datetime.utcnow()
+
+    keys, log_keys = [], []
+    for database_id, days in result.all():
+        expired = await session.execute(
+            select(Backup.key).where(
+                Backup.database_id == database_id,
+                Backup.created_at < now - timedelta(days=days),
+            )
+        )
+        keys.extend(expired.scalars().all())
+
+        expired_logs = await session.execute(
+            select(BackupRun.log_key).where(
+                BackupRun.database_id == database_id,
+                BackupRun.log_key.is_not(None),
+                BackupRun.started_at < now - timedelta(days=days),
+            )
+        )
+        log_keys.extend(expired_logs.scalars().all())
+
+    if not keys and not log_keys:
+        return {"deleted": 0, "failed": {}}
+
+    deleted = await delete_backups(keys + log_keys)
+    await remove_from_catalog(
+        session, [key for key in keys if key not in deleted["failed"]]
+    )
+    # The run history is kept, without its log
+    removed_logs = [key for key in log_keys if key not in deleted["failed"]]
+    if removed_logs:
+        await session.execute(
+            update(BackupRun)
+            .where(BackupRun.log_key.in_(removed_logs))
+            .values(log_key=None)
+        )
+        await session.commit()
+    return deleted
+
+
+async def run_retention_sweep():
+    while True:
+        try:
+            async with async_session_maker() as session:
+                result = await sweep_expired_backups(session)
+            if result["deleted"] or result["failed"]:
+                print(
+                    f"Retention sweep deleted {result['deleted']} backups, "
+                    f"{len(result['failed'])} failed"
+                )
+        except Exception as e:
+            print(f"Error sweeping expired backups: {e}")
+        await asyncio.sleep(settings.retention_sweep_interval)
@@ -0,0 +1,66 @@
+import hashlib
+from typing import Dict, Tuple
+from sqlalchemy import func
+from sqlalchemy.future import select
+from app.models import Database, BackupSchedule
+
+
+def _stable_hash(*parts) -> int:
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode("utf-8"))
+    return int.from_bytes(digest.digest()[:8], "big")
+
+
+async def _minute_density(
+    session, hour_of_day: int, database_id: str, region: str = None
+) -> Dict[int, int]:
+    # Schedules starting in the same hour, excluding the database's own
+    query = (
+        select(BackupSchedule.minute_offset, func.count(BackupSchedule.id))
+        .where(
+            BackupSchedule.hour_of_day == hour_of_day,
+            BackupSchedule.database_id != database_id,
+        )
+        .group_by(BackupSchedule.minute_offset)
+    )
+    if region is not None:
+        query = query.join(Database, Database.id == BackupSchedule.database_id).where(
+            Database.region == region
+        )
+    result = await session.execute(query)
+    return {minute: count for minute, count in result.all()}
+
+
+async def plan_backup_offset(
+    session,
+    database: Database,
+    hour_of_day: int,
+    window_start_minute: int = 0,
+    window_minutes: int = 60,
+) -> Tuple[int, int]:
+    """
+    Pick the minute and second a backup starts at inside its hour. The least
+    used minute of the window wins, first among the schedules of the same
+    region, then among every schedule writing to the bucket. Ties are broken
+    by a hash of the database id, so the same state always gives the same
+    offset and databases don't pile onto the window's first minute.
+    """
+    if window_start_minute + window_minutes > 60:
+        raise ValueError("The backup window must end within the hour.")
+
+    region_density = await _minute_density(
+        session, hour_of_day, database.id, region=database.region
+    )
+    bucket_density = await _minute_density(session, hour_of_day, database.id)
+
+    seed = _stable_hash(database.id, hour_of_day)
+    rotation = seed % window_minutes
+    candidates = [
+        window_start_minute + (rotation + i) % window_minutes
+        for i in range(window_minutes)
+    ]
+    minute = min(
+        candidates,
+        key=lambda m: (region_density.get(m, 0), bucket_density.get(m, 0)),
+    )
+    second = (seed // window_minutes) % 60
+    return minute, second
@@ -0,0 +1,199 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import paramiko
+
+
+class PooledSSHConnection:
+    """
+    An authenticated SSH connection owned by the pool, with a lazily opened
+    SFTP channel that is reused across checkouts.
+    """
+
+    def __init__(self, key: Tuple[str, str], client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.last_used = time.monotonic()
+        self._sftp = None
+
+    def is_alive(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def sftp(self) -> paramiko.SFTPClient:
+        if self._sftp is None or self._sftp.get_channel().closed:
+            self._sftp = self.client.open_sftp()
+        return self._sftp
+
+    def exec_command(self, command: str, timeout: float = None):
+        return self.client.exec_command(command, timeout=timeout)
+
+    def close(self):
+        try:
+            if self._sftp is not None:
+                self._sftp.close()
+        finally:
+            self.client.close()
+
+
+class SSHConnectionPool:
+    """
+    Thread-safe pool of SSH connections keyed by (host, username). Each host
+    gets at most max_per_host connections, idle ones are kept alive with
+    transport keepalives and closed once they have been unused for
+    idle_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int,
+        idle_timeout: float,
+        keepalive_interval: int,
+        connect_timeout: float,
+        checkout_timeout: float,
+    ):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+        self.checkout_timeout = checkout_timeout
+        self._idle: Dict[Tuple[str, str], List[PooledSSHConnection]] = {}
+        self._open: Dict[Tuple[str, str], int] = {}
+        self._cond = threading.Condition()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.discarded = 0
+
+    def _connect(self, host: str, username: str, password: str) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            host,
+            username=username,
+            password=password,
+            timeout=self.connect_timeout,
+            banner_timeout=self.connect_timeout,
+            auth_timeout=self.connect_timeout,
+        )
+        client.get_transport().set_keepalive(self.keepalive_interval)
+        return client
+
+    def _release_slot_locked(self, key: Tuple[str, str]):
+        self._open[key] -= 1
+        if self._open[key] <= 0:
+            del self._open[key]
+        self._cond.notify_all()
+
+    def _take_idle_expired_locked(self) -> List[PooledSSHConnection]:
+        now = time.monotonic()
+        expired = []
+        for key, idle in list(self._idle.items()):
+            keep = []
+            for conn in idle:
+                if now - conn.last_used > self.idle_timeout or not conn.is_alive():
+                    expired.append(conn)
+                    self._release_slot_locked(key)
+                else:
+                    keep.append(conn)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        self.evicted += len(expired)
+        return expired
+
+    def evict_idle(self):
+        with self._cond:
+            expired = self._take_idle_expired_locked()
+        for conn in expired:
+            conn.close()
+
+    def checkout(self, host: str, username: str, password: str) -> PooledSSHConnection:
+        key = (host, username)
+        deadline = time.monotonic() + self.checkout_timeout
+
+        with self._cond:
+            expired = self._take_idle_expired_locked()
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    conn = idle.pop()
+                    if not idle:
+                        del self._idle[key]
+                    self.reused += 1
+                    break
+                if self._open.get(key, 0) < self.max_per_host:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No SSH connection to {host} available")
+                self._cond.wait(remaining)
+
+        for stale in expired:
+            stale.close()
+        if conn is not None:
+            return conn
+
+        # Handshake outside the lock, the slot is already reserved
+        try:
+            client = self._connect(host, username, password)
+        except Exception:
+            with self._cond:
+                self._release_slot_locked(key)
+            raise
+        with self._cond:
+            self.created += 1
+        return PooledSSHConnection(key, client)
+
+    def checkin(self, conn: PooledSSHConnection, discard: bool = False):
+        with self._cond:
+            if discard or not conn.is_alive():
+                self.discarded += 1
+                self._release_slot_locked(conn.key)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(conn.key, []).append(conn)
+                self._cond.notify_all()
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self, host: str, username: str, password: str):
+        conn = self.checkout(host, username, password)
+        try:
+            yield conn
+        except (paramiko.SSHException, OSError):
+            # The transport may be broken, don't hand it out again
+            self.checkin(conn, discard=True)
+            raise
+        except BaseException:
+            self.checkin(conn)
+            raise
+        else:
+            self.checkin(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            for conn in idle:
+                self._release_slot_locked(conn.key)
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "hosts": len(self._open),
+                "open": sum(self._open.values()),
+                "idle": sum(len(conns) for conns in self._idle.values()),
+                "max_per_host": self.max_per_host,
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+                "discarded": self.discarded,
+            }
@@ -0,0 +1,235 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import numpy as np
+from app.config import settings
+from app.utils.executors import run_blocking, LINODE_API_POOL
+from app.utils.linode import get_linode_stats
+
+STATS_AGGREGATIONS = ("avg", "max", "p95")
+# Linode samples instance stats every 5 minutes
+STATS_MIN_RESOLUTION = 300
+
+
+class RingBuffer:
+    """
+    Fixed-capacity, array-backed series of (timestamp, value) points in
+    increasing timestamp order.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+
+    def last_timestamp(self) -> Optional[int]:
+        if self.size == 0:
+            return None
+        return int(self.timestamps[(self.start + self.size - 1) % self.capacity])
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        last = self.last_timestamp()
+        if last is not None:
+            newer = timestamps > last
+            timestamps, values = timestamps[newer], values[newer]
+        count = len(timestamps)
+        if count == 0:
+            return
+        if count >= self.capacity:
+            timestamps, values = timestamps[-self.capacity :], values[-self.capacity :]
+            count = self.capacity
+
+        positions = (self.start + self.size + np.arange(count)) % self.capacity
+        self.timestamps[positions] = timestamps
+        self.values[positions] = values
+        overflow = max(self.size + count - self.capacity, 0)
+        self.start = (self.start + overflow) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def window(self, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = (self.start + np.arange(self.size)) % self.capacity
+        timestamps, values = self.timestamps[order], self.values[order]
+        selected = (timestamps >= start) & (timestamps <= end)
+        return timestamps[selected], values[selected]
+
+    def latest(self) -> Optional[Tuple[int, float]]:
+        if self.size == 0:
+            return None
+        position = (self.start + self.size - 1) % self.capacity
+        return int(self.timestamps[position]), float(self.values[position])
+
+
+def downsample(
+    timestamps: np.ndarray, values: np.ndarray, start: int, resolution: int, agg: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate sorted points into buckets of `resolution` seconds starting at
+    `start`, without a Python loop over buckets.
+    """
+    if len(timestamps) == 0:
+        return timestamps, values
+
+    buckets = (timestamps - start) // resolution
+    bucket_ids, firsts, counts = np.unique(
+        buckets, return_index=True, return_counts=True
+    )
+
+    if agg == "avg":
+        aggregated = np.add.reduceat(values, firsts) / counts
+    elif agg == "max":
+        aggregated = np.maximum.reduceat(values, firsts)
+    elif agg == "p95":
+        # Nearest-rank percentile: sort values within each bucket, then index
+        sorted_values = values[np.lexsort((values, buckets))]
+        ranks = np.ceil(0.95 * counts).astype(np.int64) - 1
+        aggregated = sorted_values[firsts + ranks]
+    else:
+        raise ValueError(f"Unsupported aggregation {agg}")
+
+    return start + bucket_ids * resolution, aggregated
+
+
+def flatten_linode_stats(data: dict, prefix: str = "") -> Iterable:
+    """
+    Yield (metric, points) for every series of a Linode stats payload, e.g.
+    cpu, io.io, netv4.in.
+    """
+    for name, series in data.items():
+        metric = f"{prefix}{name}"
+        if isinstance(series, dict):
+            yield from flatten_linode_stats(series, prefix=f"{metric}.")
+        elif isinstance(series, list) and series and isinstance(series[0], list):
+            yield metric, series
+
+
+class StatsStore:
+    """
+    Per-instance ring buffers of Linode stats, ingested at most once per
+    interval however often they are read.
+    """
+
+    def __init__(self, capacity: int, ingest_interval: float):
+        self.capacity = capacity
+        self.ingest_interval = ingest_interval
+        self._series: Dict[str, Dict[str, RingBuffer]] = {}
+        self._ingested_at: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.ingests = 0
+        self.skipped = 0
+
+    def _instance_lock(self, instance_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(instance_id, threading.Lock())
+
+    def is_fresh(self, instance_id: str) -> bool:
+        ingested_at = self._ingested_at.get(instance_id)
+        return (
+            ingested_at is not None
+            and time.monotonic() - ingested_at < self.ingest_interval
+        )
+
+    def ingest(self, instance_id: str, data: dict):
+        series = self._series.setdefault(instance_id, {})
+        for metric, points in flatten_linode_stats(data):
+            points = np.asarray(points, dtype=np.float64)
+            if points.ndim != 2 or points.shape[1] != 2:
+                continue
+            buffer = series.get(metric)
+            if buffer is None:
+                buffer = series[metric] = RingBuffer(self.capacity)
+            # Linode timestamps are in milliseconds
+            buffer.extend((points[:, 0] // 1000).astype(np.int64), points[:, 1])
+
+    def ensure_fresh(self, instance_id: str, fetch: Callable[[str], dict]) -> dict:
+        """
+        Fetch and ingest the instance's stats unless they were ingested during
+        the last interval. Concurrent callers share a single fetch.
+        """
+        with self._instance_lock(instance_id):
+            if self.is_fresh(instance_id):
+                self.skipped += 1
+            else:
+                stats = fetch(instance_id)
+                self.ingests += 1
+                if stats.get("status", False):
+                    self.ingest(instance_id, stats)
+                    self._errors.pop(instance_id, None)
+                else:
+                    self._errors[instance_id] = stats.get("error", "")
+                self._ingested_at[instance_id] = time.monotonic()
+
+            return self.status(instance_id)
+
+    def status(self, instance_id: str) -> dict:
+        error = self._errors.get(instance_id)
+        return {"status": error is None, "error": error}
+
+    def query(
+        self,
+        instance_id: str,
+        start: int,
+        end: int,
+        resolution: int,
+        agg: str = "avg",
+        metrics: Optional[Iterable[str]] = None,
+    ) -> dict:
+        with self._instance_lock(instance_id):
+            series = self._series.get(instance_id, {})
+            names = [m for m in (metrics or series) if m in series]
+            result = {}
+            for name in names:
+                timestamps, values = series[name].window(start, end)
+                timestamps, values = downsample(
+                    timestamps, values, start, resolution, agg
+                )
+                result[name] = [
+                    list(point) for point in zip(timestamps.tolist(), values.tolist())
+                ]
+            return result
+
+    def latest(self, instance_id: str) -> dict:
+        with self._instance_lock(instance_id):
+            series = self._series.get(instance_id, {})
+            return {
+                name: list(point)
+                for name, buffer in series.items()
+                if (point := buffer.latest()) is not None
+            }
+
+    def forget(self, instance_id: str):
+        with self._lock:
+            self._series.pop(instance_id, None)
+            self._ingested_at.pop(instance_id, None)
+            self._errors.pop(instance_id, None)
+            self._locks.pop(instance_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "instances": len(self._series),
+                "series": sum(len(series) for series in self._series.values()),
+                "ingests": self.ingests,
+                "skipped": self.skipped,
+            }
+
+
+stats_store = StatsStore(settings.stats_buffer_capacity, settings.stats_ingest_interval)
+
+
+async def refresh_instance_stats(instance_id: str) -> dict:
+    if stats_store.is_fresh(instance_id):
+        stats_store.skipped += 1
+        return stats_store.status(instance_id)
+    return await run_blocking(
+        LINODE_API_POOL, stats_store.ensure_fresh, instance_id, get_linode_stats
+    )
+
+
+async def get_instance_stats_summary(instance_id: str) -> dict:
+    # Compact replacement for the raw stats blob: the latest point per series
+    status = await refresh_instance_stats(instance_id)
+    return {**status, "latest": stats_store.latest(instance_id)}
@@ -1,4 +1,5 @@
 import os
+import json
 import requests
 from dotenv import load_dotenv
 from app.setup.db_setup import create_db_and_tables
@@ -32,12 +33,24 @@ def create_database(
             "region": region,
         },
     )
-    assert response.status_code == 200, f"Failed to create database: {response.text}"
-    return response.json()
+    assert response.status_code == 202, f"Failed to create database: {response.text}"
+    return wait_for_job(response.json()["job_id"])
+
+
+def wait_for_job(job_id: str, interval: int = 10):
+    while True:
+        response = requests.get(f"{BASE_URL}/jobs/{job_id}")
+        assert response.status_code == 200, f"Failed to get job: {response.text}"
+        job = response.json()
+        print(f"Job {job_id}: {job['status']} ({job['step']})")
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(interval)
 
 
-def list_databases():
-    response = requests.get(f"{BASE_URL}/databases")
+def list_databases(user_id: str = None, cursor: str = None):
+    params = {k: v for k, v in {"user_id": user_id, "cursor": cursor}.items() if v}
+    response = requests.get(f"{BASE_URL}/databases", params=params)
     assert response.status_code == 200, f"Failed to list databases: {response.text}"
     return response.json()
 
@@ -102,8 +115,26 @@ def get_linode_health(db_id: str):
         print(response.json())
 
 
-def list_backups(db_id: str):
-    response = requests.get(f"{BASE_URL}/databases/{db_id}/backups")
+def watch_events(db_id: str = None, user_id: str = None, max_events: int = None):
+    """
+    Print status and stats changes pushed by the server instead of polling.
+    """
+    path = f"databases/{db_id}" if db_id else f"users/{user_id}"
+    with requests.get(f"{BASE_URL}/{path}/events", stream=True) as response:
+        assert response.status_code == 200, f"Failed to watch: {response.text}"
+        received = 0
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            print(json.loads(line[len("data: ") :]))
+            received += 1
+            if max_events and received >= max_events:
+                return
+
+
+def list_backups(db_id: str, cursor: str = None):
+    params = {"cursor": cursor} if cursor else {}
+    response = requests.get(f"{BASE_URL}/databases/{db_id}/backups", params=params)
     assert response.status_code == 200, f"Failed to list backups: {response.text}"
     return response.json()
 